@@ -1,415 +1,392 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import mplfinance as mpf
-import time
-import requests
-from bs4 import BeautifulSoup
-import numpy as np
+import contextvars
+import functools
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib.pyplot as plt
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from stock_core.cache import cached, is_market_open, market_ttl
+from stock_core.feed import FEED, QUOTE_INTERVAL
+from stock_core import (BENCHMARK, FIB_WINDOWS, METRICS, TRADE_FEE, TRADE_TAX, MarketMatrix, analyze_signals,
+                        backtest_signals, calculate_fibonacci_multi, calculate_indicators, ensure_symbol_master,
+                        extend_indicators, fetch_stock_data, fibonacci_bands, fibonacci_signals, financial_metrics,
+                        generate_dual_strategy, get_statements, get_stock_name, load_indicator_state, load_indicators,
+                        load_precomputed, load_valuation, lookup_symbol, screen_tickers, top_by, universe_tickers,
+                        UpstreamError, update_universe_bars, view_columns)
 
-# ==========================================
-# 1. 資料抓取函數 (技術面)
-# ==========================================
-@st.cache_data(ttl=3600)
-def get_stock_data_v3(stock_code):
-    stock_code = str(stock_code).strip()
-    suffixes = [".TW", ".TWO"]
-    df = pd.DataFrame()
-    found_ticker = ""
-    for suffix in suffixes:
-        try:
-            ticker = f"{stock_code}{suffix}"
-            stock = yf.Ticker(ticker)
-            temp_df = stock.history(period="500d", auto_adjust=False)
-            if not temp_df.empty:
-                df = temp_df
-                found_ticker = ticker
-                break
-            time.sleep(0.5) 
-        except Exception:
-            continue
-    if df.empty: return pd.DataFrame(), ""
-    try:
-        if df.index.tz is not None: df.index = df.index.tz_localize(None)
-        df.columns = [str(c).lower() for c in df.columns]
-        df.index.name = 'date'
-        return df, found_ticker
-    except Exception: return pd.DataFrame(), ""
+# 抓取、指標、策略與回測都在 stock_core (不依賴 Streamlit，排程與批次也用同一套)；
+# 這裡只負責快取、並行抓取、畫圖與介面。
 
 # ==========================================
-# 2. 獲取公司名稱
+# 1. 效能量測 (分段計時 / 快取命中 / 上游呼叫)
 # ==========================================
-@st.cache_data(ttl=86400)
-def get_stock_name(stock_code):
-    code = str(stock_code).strip()
-    stock_map = {
-        "0050": "元大台灣50", "0056": "元大高股息", "00878": "國泰永續高股息", "00929": "復華台灣科技優息",
-        "2330": "台積電", "2454": "聯發科", "2303": "聯電", "2317": "鴻海",
-        "2308": "台達電", "3711": "日月光投控", "2382": "廣達", "3231": "緯創",
-        "6669": "緯穎", "2357": "華碩", "2356": "英業達", "3008": "大立光",
-        "3034": "聯詠", "2379": "瑞昱", "3037": "欣興", "2603": "長榮", "2609": "陽明",
-        "2615": "萬海", "2618": "長榮航", "2610": "華航", "2002": "中鋼",
-        "2881": "富邦金", "2882": "國泰金", "2891": "中信金"
-    }
-    if code in stock_map: return stock_map[code]
-    try:
-        url = f"https://tw.stock.yahoo.com/quote/{code}"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        res = requests.get(url, headers=headers, timeout=5)
-        if res.status_code == 200:
-            soup = BeautifulSoup(res.text, 'html.parser')
-            title = soup.title.string
-            if title and "(" in title: return title.split("(")[0].strip()
-            return title
-    except Exception: pass
-    return code
+# STOCK_METRICS_LOG=路徑：每次 rerun 追加一行 JSON；STOCK_METRICS_PORT=埠號：http://127.0.0.1:埠號/metrics
+METRICS_PORT = os.environ.get("STOCK_METRICS_PORT")
+
+@st.cache_resource
+def start_metrics_server(port):
+    """本機 scrape 端點：GET /metrics 回傳 METRICS.snapshot() 的 JSON"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = json.dumps(METRICS.snapshot(), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args): pass
+    server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
 
 # ==========================================
-# 3. 指標計算 (完整版：含 ADX, OBV, ATR)
+# 2. 資料抓取 (快取 / 並行)
 # ==========================================
-def calculate_indicators(df):
-    df = df.copy()
-    try:
-        # MA & Volume MA
-        if len(df) >= 5: df['MA5'] = df['close'].rolling(5).mean()
-        if len(df) >= 10: df['MA10'] = df['close'].rolling(10).mean()
-        if len(df) >= 20: df['MA20'] = df['close'].rolling(20).mean()
-        if len(df) >= 60: df['MA60'] = df['close'].rolling(60).mean()
-        if len(df) >= 5: df['VolMA5'] = df['volume'].rolling(5).mean()
-
-        # KD & MACD & RSI & BB & BBW
-        rsv_min = df['low'].rolling(9).min()
-        rsv_max = df['high'].rolling(9).max()
-        rsv_den = rsv_max - rsv_min
-        rsv_den[rsv_den == 0] = 1 
-        df['RSV'] = (df['close'] - rsv_min) / rsv_den * 100
-        df['K'] = df['RSV'].ewm(com=2).mean()
-        df['D'] = df['K'].ewm(com=2).mean()
-        exp12 = df['close'].ewm(span=12, adjust=False).mean()
-        exp26 = df['close'].ewm(span=26, adjust=False).mean()
-        df['MACD'] = exp12 - exp26
-        df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        df['Hist'] = df['MACD'] - df['Signal']
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        df['BB_Mid'] = df['close'].rolling(window=20).mean()
-        df['BB_Std'] = df['close'].rolling(window=20).std()
-        df['BB_Up'] = df['BB_Mid'] + 2 * df['BB_Std']
-        df['BB_Low'] = df['BB_Mid'] - 2 * df['BB_Std']
-        df['BBW'] = (df['BB_Up'] - df['BB_Low']) / df['BB_Mid']
-        
-        # --- 進階指標：OBV & ADX & ATR ---
-        df['OBV'] = (np.sign(df['close'].diff()) * df['volume']).fillna(0).cumsum()
-        
-        # ADX 計算
-        df['UpMove'] = df['high'] - df['high'].shift(1)
-        df['DownMove'] = df['low'].shift(1) - df['low']
-        df['+DM'] = np.where((df['UpMove'] > df['DownMove']) & (df['UpMove'] > 0), df['UpMove'], 0)
-        df['-DM'] = np.where((df['DownMove'] > df['UpMove']) & (df['DownMove'] > 0), df['DownMove'], 0)
-        df['TR'] = np.where((df['high'] - df['low']) > (df['high'] - df['close'].shift(1)).abs(),
-                             np.where((df['high'] - df['low']) > (df['low'] - df['close'].shift(1)).abs(),
-                                      df['high'] - df['low'], (df['low'] - df['close'].shift(1)).abs()),
-                             (df['high'] - df['close'].shift(1)).abs()).fillna(0)
-        n = 14
-        df['ATR'] = df['TR'].ewm(span=n, adjust=False).mean()
-        df['+DM_EMA'] = df['+DM'].ewm(span=n, adjust=False).mean()
-        df['-DM_EMA'] = df['-DM'].ewm(span=n, adjust=False).mean()
-        df['+DI'] = (df['+DM_EMA'] / df['ATR']) * 100
-        df['-DI'] = (df['-DM_EMA'] / df['ATR']) * 100
-        df['DX'] = (abs(df['+DI'] - df['-DI']) / (df['+DI'] + df['-DI'])) * 100
-        df['ADX'] = df['DX'].ewm(span=n, adjust=False).mean()
-        
-        # 量能趨勢
-        df['Vol_Shift1'] = df['volume'].shift(1)
-        df['Vol_Shift2'] = df['volume'].shift(2)
-        df['Vol_Inc'] = (df['volume'] > df['Vol_Shift1']) & (df['Vol_Shift1'] > df['Vol_Shift2'])
-        df['Vol_Dec'] = (df['volume'] < df['Vol_Shift1']) & (df['Vol_Shift1'] < df['Vol_Shift2'])
-        
-        # ATR 平均 (波動度)
-        df['ATR_Avg'] = df['ATR'].tail(20).mean()
+# 結果快取走 stock_core.cache (STOCK_CACHE 可改成多個 worker 共用的 SQLite / Redis)；
+# 報價盤中只快取 2 分鐘，收盤定案後一直用到下次開盤。
+# 選股固定快取 1 小時：K 棒可能由另一個行程 (python -m stock_core bars --universe) 更新，清不到這裡的快取
+PRICE_TTL = functools.partial(market_ttl, 120)
+SCREEN_TTL = 3600
+
+@cached("get_stock_data_v3", PRICE_TTL, stage="fetch_price")
+def get_stock_data_v3(stock_code):
+    return fetch_stock_data(stock_code)
+
+@cached("get_financial_data", 3600, stage="fetch_financials")
+def get_financial_data(stock_code, ticker=None):
+    return get_statements(stock_code, ticker=ticker)
+
+@cached("valuation", 600, stage="load_valuation")
+def get_valuation():
+    return load_valuation()
+
+@cached("screen_universe", SCREEN_TTL, stage="screener")
+def screen_universe(tickers):
+    return screen_tickers(tickers)
+
+class UniverseUpdate:
+    """全市場 K 棒的背景更新 (上游限流下 2000 檔要十幾分鐘，不能卡住頁面)；每個伺服器行程同時至多一個在跑"""
+    def __init__(self):
+        self.done = self.total = 0
+        self.counts = {"ok": 0, "failed": 0}
+        self.finished = False  # 最近一次更新已結束 (不論成敗)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, tickers):
+        with self._lock:
+            if self.running(): return False
+            self.done, self.total = 0, len(tickers)
+            self.counts, self.finished = {"ok": 0, "failed": 0}, False
+            self._thread = threading.Thread(target=self._run, args=(list(tickers),), daemon=True, name="universe-bars")
+            self._thread.start()
+        return True
+
+    def _run(self, tickers):
+        try: update_universe_bars(tickers, progress=self._progress, counts=self.counts)
+        finally:
+            screen_universe.clear()
+            self.finished = True
 
-    except Exception: pass
-    return df
+    def _progress(self, i, n):
+        self.done = i
+        if i % 100 == 0: screen_universe.clear()  # 邊更新邊讓選股讀到新 K 棒
+
+@st.cache_resource
+def get_universe_update():
+    return UniverseUpdate()
+
+@cached("precomputed", 600, stage="load_precomputed")
+def get_precomputed(stock_code, last_date):
+    """python -m stock_core batch 算好的逐日指標 (last_date 只用來在 K 棒前進時換掉快取)；
+    由 load_indicators 判斷能否直接用或只接上最新一根"""
+    return load_precomputed(stock_code)
+
+def get_indicators(stock_code, ticker, bars, columns):
+    return load_indicators(stock_code, ticker, bars, columns, history=get_precomputed(stock_code, bars.index[-1]))
+
+@st.cache_resource(max_entries=4)
+def get_market_matrix(tickers):
+    """跨股收盤矩陣與滾動相關：每組代碼每個行程只建一次，之後每次 rerun 只讀入新的 K 棒"""
+    with METRICS.timed("market_matrix_build"): return MarketMatrix.from_store(tickers)
+
+# 頁面載入時各資料來源並行抓取，各自有逾時上限；每個來源各有自己的執行緒池，
+# 慢的財報 (每檔兩個限流請求) 再多也不會排在其他人的價格前面
+FETCH_TIMEOUTS = {"price": 30, "financials": 45}
+FETCH_WORKERS = {"price": 8, "financials": 4}
+@st.cache_resource
+def get_fetch_pools():
+    return {source: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"fetch-{source}") for source, n in FETCH_WORKERS.items()}
+
+_FETCH_POOLS = get_fetch_pools()
+
+def submit_fetch(source, fn, *args):
+    """丟到 source 的背景執行緒執行；帶上目前的 script context，讓 st.cache_data 等在執行緒內照常運作"""
+    ctx = get_script_run_ctx()
+    def run():
+        if ctx is not None: add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return _FETCH_POOLS[source].submit(contextvars.copy_context().run, run)
+
+def fetch_result(future, source, default):
+    """等待結果至該來源的逾時上限；逾時或上游失敗時回傳 default (其他例外照常丟出)"""
+    try: return future.result(timeout=FETCH_TIMEOUTS[source])
+    except (UpstreamError, TimeoutError): return default
 
 # ==========================================
-# 4. 深度 AI 策略分析 (含評分與多空健檢)
+# 3. K 線圖繪製 (PNG 快取)
 # ==========================================
-def calculate_score(df):
-    score = 50 
-    last = df.iloc[-1]
-    prev = df.iloc[-2]
-    
-    # 1. 趨勢 (40%)
-    if last['close'] > last['MA20']: score += 10 
-    if last['MA20'] > last['MA60']: score += 10
-    if last['close'] > last['MA60']: score += 10
-    if last['MA5'] > last['MA20']: score += 10
-    
-    if last['close'] < last['MA20']: score -= 10
-    if last['MA20'] < last['MA60']: score -= 10
-    if last['close'] < last['MA60']: score -= 10
-    if last['MA5'] < last['MA20']: score -= 10
-    
-    # 2. 動能 (30%) - 考慮 ADX 濾鏡
-    adx_filter = last['ADX'] > 25 if 'ADX' in df.columns and not pd.isna(last['ADX']) else True
-    
-    if last['MACD'] > 0 and adx_filter: score += 5
-    if last['Hist'] > 0 and adx_filter: score += 5
-    if last['K'] > last['D'] and adx_filter: score += 5
-    
-    # RSI 修正
-    if last['RSI'] > 80: score -= 5 
-    if last['RSI'] < 20: score += 5 
-    
-    # 3. 量價 (20%)
-    vol_ratio = last['volume'] / last['VolMA5'] if 'VolMA5' in df.columns else 1
-    if last['close'] > prev['close'] and vol_ratio > 1.2: score += 5 
-    if last['close'] < prev['close'] and vol_ratio > 1.2: score -= 5 
-    if 'Vol_Inc' in df.columns and last['Vol_Inc'] == True: score += 5
-    
-    # 4. 突破 (10%)
-    if 'BBW' in df.columns and last['BBW'] > df['BBW'].tail(60).quantile(0.85):
-        if last['close'] > last['BB_Up']: score = 100 
-        
-    return max(0, min(100, score))
+TAIWAN_STYLE = mpf.make_marketcolors(up='g', down='r', edge='inherit', wick='inherit', volume='inherit')
+TAIWAN_RC = mpf.make_mpf_style(marketcolors=TAIWAN_STYLE)
+CHART_PERIODS = {"1個月": 20, "3個月": 60, "半年": 120, "1年": 240}
+DEFAULT_VIEW = ("3個月", ("MA5", "MA20", "MA60"), ("Volume", "KD"))
+POPULAR_CODES = ["0050", "0056", "2330", "2454", "2317", "2303", "2308", "2382", "2881", "2882"]
+_RENDER_LOCK = threading.Lock()  # pyplot 的全域狀態不是執行緒安全的
 
-def analyze_volume(df):
-    if 'VolMA5' not in df.columns: return "無量能資料"
-    last = df.iloc[-1]
-    
-    vol_trend_msg = ""
-    if 'Vol_Inc' in df.columns and last['Vol_Inc'] == True: vol_trend_msg = "🔥 3日連增"
-    elif 'Vol_Dec' in df.columns and last['Vol_Dec'] == True: vol_trend_msg = "❄️ 3日連縮"
-    
-    vol_ratio = last['volume'] / last['VolMA5']
-    status = "量平"
-    if vol_ratio > 1.5: status = "爆量"
-    elif vol_ratio > 1.2: status = "放量"
-    elif vol_ratio < 0.6: status = "窒息量"
-    elif vol_ratio < 0.8: status = "量縮"
-
-    return f"{status} ({vol_trend_msg if vol_trend_msg else '持平'})"
-
-def analyze_signals(df):
-    if len(df) < 2: return ["資料不足"]
+class ChartCache:
+    """以 (代碼, 最後一根 K 棒, 範圍, 均線, 副圖) 為鍵的 PNG 快取，超過上限時淘汰最久未用者"""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, png):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self): return len(self._items)
+
+@st.cache_resource
+def get_chart_cache():
+    cache = ChartCache()
+    METRICS.register("chart_cache", lambda: {"hits": cache.hits, "misses": cache.misses,
+                                             "evictions": cache.evictions, "entries": len(cache)})
+    return cache
+
+def render_kline_png(plot_df, mas, inds):
+    add_plots = []
+    colors = {'MA5':'orange', 'MA10':'cyan', 'MA20':'purple', 'MA60':'green'}
+    for ma in mas:
+        if ma in plot_df.columns: add_plots.append(mpf.make_addplot(plot_df[ma], panel=0, color=colors[ma], width=1.0))
+
+    if "BB" in inds:
+        add_plots.append(mpf.make_addplot(plot_df['BB_Up'], panel=0, color='red', linestyle='dashed', width=0.5))
+        add_plots.append(mpf.make_addplot(plot_df['BB_Mid'], panel=0, color='gray', linestyle='dashed', width=0.5))
+        add_plots.append(mpf.make_addplot(plot_df['BB_Low'], panel=0, color='green', linestyle='dashed', width=0.5))
+
+    pid = 0
+    vol = False
+    if "Volume" in inds: pid+=1; vol=True
+    if "KD" in inds:
+        pid+=1
+        add_plots.append(mpf.make_addplot(plot_df['K'], panel=pid, color='orange'))
+        add_plots.append(mpf.make_addplot(plot_df['D'], panel=pid, color='blue'))
+    if "MACD" in inds:
+        pid+=1
+        add_plots.append(mpf.make_addplot(plot_df['MACD'], panel=pid, color='red'))
+        add_plots.append(mpf.make_addplot(plot_df['Signal'], panel=pid, color='blue'))
+        add_plots.append(mpf.make_addplot(plot_df['Hist'], type='bar', panel=pid, color='gray', alpha=0.5))
+    if "RSI" in inds:
+        pid+=1
+        add_plots.append(mpf.make_addplot(plot_df['RSI'], panel=pid, color='#9b59b6'))
+        add_plots.append(mpf.make_addplot([70]*len(plot_df), panel=pid, color='gray', linestyle='dashed'))
+        add_plots.append(mpf.make_addplot([30]*len(plot_df), panel=pid, color='gray', linestyle='dashed'))
+    if "ADX" in inds:
+        pid+=1
+        add_plots.append(mpf.make_addplot(plot_df['ADX'], panel=pid, color='blue', title='ADX'))
+        add_plots.append(mpf.make_addplot([25]*len(plot_df), panel=pid, color='orange', linestyle='dashed', width=0.8))
+    if "OBV" in inds:
+        pid+=1
+        add_plots.append(mpf.make_addplot(plot_df['OBV'], panel=pid, color='purple', type='line', title='OBV'))
+
+    panel_ratios = tuple([2] + [1] * pid)
+    with _RENDER_LOCK, METRICS.timed("chart_render"):
+        fig, ax = mpf.plot(plot_df, style=TAIWAN_RC, type='candle', volume=vol, addplot=add_plots, returnfig=True, panel_ratios=panel_ratios, figsize=(10, 8), warn_too_much_data=10000)
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        finally:
+            plt.close(fig)
+    return buf.getvalue()
+
+def kline_chart(df, ticker, time_period, mas, inds):
+    """回傳 K 線圖 PNG；同一檢視 (含最後一根價格) 畫過就直接取快取"""
     last = df.iloc[-1]
-    prev = df.iloc[-2]
-    signals = []
-    
-    # ATR
-    if 'ATR_Avg' in df.columns and not pd.isna(last['ATR_Avg']):
-        current_atr = last['ATR']
-        avg_atr = last['ATR_Avg']
-        if current_atr > avg_atr * 1.5: signals.append(f"🚨 **波動度過高**：風險放大，建議減小部位。")
-        elif current_atr < avg_atr * 0.5: signals.append(f"😴 **波動度極低**：市場極度沉悶。")
-
-    # BB 突破
-    if 'BBW' in df.columns:
-        bbw_avg = df['BBW'].tail(60).mean()
-        if last['BBW'] < bbw_avg * 0.8: signals.append("🧘 **低波動整理**：布林通道收斂，等待大行情。")
-        elif last['close'] > last['BB_Up'] and last['BBW'] > bbw_avg * 1.2: signals.append("🚀 **趨勢突破確立**：股價創高且布林通道開口放大。")
-    
-    # MA
-    if 'MA5' in df.columns and 'MA20' in df.columns:
-        if last['MA5'] > last['MA20'] > last['MA60']: signals.append("🔥 **趨勢**：多頭排列")
-        if prev['MA5'] < prev['MA20'] and last['MA5'] > last['MA20']: signals.append("✨ **均線金叉**：5日穿月線")
-        if prev['MA5'] > prev['MA20'] and last['MA5'] < last['MA20']: signals.append("💀 **均線死叉**：5日破月線")
-        
-    # ADX & OBV
-    if 'ADX' in df.columns and not pd.isna(last['ADX']):
-        adx_val = last['ADX']
-        if adx_val > 40: signals.append(f"🚀 **ADX極強 ({adx_val:.1f})**：趨勢爆發，動能最強。")
-        elif adx_val > 25: signals.append(f"💪 **ADX強勢 ({adx_val:.1f})**：趨勢確立，可信度高。")
-        elif adx_val < 20: signals.append(f"🟰 **ADX疲弱 ({adx_val:.1f})**：進入盤整，訊號可信度低。")
-            
-    if 'OBV' in df.columns:
-        obv_trend = last['OBV'] > df['OBV'].iloc[-5:-1].mean()
-        price_up = last['close'] > df['close'].iloc[-5:-1].mean()
-        if obv_trend and price_up: signals.append("✅ **量價同步**：OBV上升，量能推動價格。")
-        elif not obv_trend and price_up: signals.append("❌ **量價背離**：價格上漲但OBV下降，動能不足。")
-        
-    return signals if signals else ["⚖️ 盤整中"]
+    key = (ticker, df.index[-1].strftime('%Y-%m-%d'), float(last['close']), time_period, tuple(mas), tuple(inds))
+    cache = get_chart_cache()
+    png = cache.get(key)
+    if png is None:
+        png = render_kline_png(df.tail(CHART_PERIODS[time_period]), mas, inds)
+        cache.put(key, png)
+    return png
+
+FIB_COLORS = {'0.0 (低)': 'green', '0.382': 'teal', '0.5': 'gray', '0.618': 'orange', '1.0 (高)': 'red'}
 
-def generate_dual_strategy(df):
-    if len(df) < 60: return None, None
+def render_fibonacci_png(plot_df, bands):
+    add_plots = [mpf.make_addplot(bands[k], panel=0, color=c, linestyle='dashed', width=0.8)
+                 for k, c in FIB_COLORS.items() if bands[k].notna().any()]
+    with _RENDER_LOCK, METRICS.timed("chart_render"):
+        fig, ax = mpf.plot(plot_df, style=TAIWAN_RC, type='candle', addplot=add_plots, returnfig=True, figsize=(10, 5), warn_too_much_data=10000)
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        finally:
+            plt.close(fig)
+    return buf.getvalue()
+
+def fibonacci_chart(df, ticker, window, time_period):
+    """K 線疊上逐日的黃金分割通道 (每一天都是當時 window 日的高低點)"""
     last = df.iloc[-1]
-    last_close = last['close']
-    score = calculate_score(df)
-    vol_status = analyze_volume(df)
-    
-    # 健檢清單
-    checklist = {
-        "站上月線 (MA20)": last_close > last['MA20'], 
-        "季線多頭 (MA60向上)": last['MA20'] > last['MA60'],
-        "KD金叉向上": last['K'] > last['D'],
-        "MACD偏多 (Hist > 0)": last['Hist'] > 0, 
-        "RSI安全 (20~75)": 20 < last['RSI'] < 75
-    }
-    
-    # 短線策略
-    short_term = {"title": "中性觀望", "icon": "⚖️", "color": "gray", "action": "觀望", "score": score, "vol": vol_status, "desc": "多空不明，等待訊號。"}
-    sl_short = last['MA20'] if 'MA20' in df.columns else last_close * 0.9
-    tp_short = last['BB_Up'] if 'BB_Up' in df.columns else last_close * 1.1
-
-    if score >= 95:
-        short_term.update({"title": "🚀 趨勢噴發", "icon": "🚀", "color": "green", "action": "現價佈局", 
-                         "desc": "訊號極強，已脫離整理區間。", "entry_text": f"建議現價或回測 **{last['MA5']:.2f}** 佈局。"})
-    elif last_close > last['MA20'] and last['K'] < 80:
-        short_term.update({"title": "短多操作", "icon": "⚡", "color": "green", "action": "拉回佈局", 
-                         "desc": "股價站上月線，短線強勢。", "entry_text": f"建議拉回測試 **{last['MA20']:.2f}** 不破時佈局。"})
-        if last['RSI'] > 75: 
-            short_term.update({"title": "短線過熱", "icon": "🔥", "color": "orange", "action": "分批獲利", "desc": "雖為多頭但過熱，留意修正。"})
-    elif last_close < last['MA20']:
-        short_term.update({"title": "短線偏空", "icon": "📉", "color": "red", "action": "反彈減碼", 
-                         "desc": "跌破月線，短線轉弱。", "entry_text": "暫不建議進場，待站回月線。"})
-        tp_short = last['MA20']
-    
-    short_term["stop_loss"] = f"{sl_short:.2f}"
-    short_term["take_profit"] = f"{tp_short:.2f}"
-    short_term["checklist"] = checklist
-
-    # 長線策略
-    long_term = {"title": "中性持有", "icon": "🐢", "color": "gray", "action": "續抱", "desc": "趨勢盤整"}
-    sl_long = last['MA60'] if 'MA60' in df.columns else last_close * 0.85
-    tp_long = df['high'].tail(120).max()
-    if last_close > last['MA60']:
-        long_term.update({"title": "長線多頭", "icon": "🚀", "color": "green", "action": "波段續抱", "desc": "站穩季線，長多格局。"})
-    elif last_close < last['MA60']:
-        long_term.update({"title": "長線轉弱", "icon": "❄️", "color": "red", "action": "保守應對", "desc": "跌破季線，需提防反轉。"})
-        tp_long = last['MA60']
-
-    long_term["stop_loss"] = f"{sl_long:.2f}"
-    long_term["take_profit"] = f"{tp_long:.2f}"
-    return short_term, long_term
-
-def calculate_fibonacci_multi(df):
-    def get_levels(window_days):
-        if len(df) < window_days: return {}
-        subset = df.tail(window_days)
-        h, l = subset['high'].max(), subset['low'].min()
-        d = h - l
-        return {'0.0 (低)': l, '0.382': l+d*0.382, '0.5': l+d*0.5, '0.618': l+d*0.618, '1.0 (高)': h}
-    return get_levels(20), get_levels(60), get_levels(240)
+    key = ("fib", ticker, df.index[-1].strftime('%Y-%m-%d'), float(last['close']), window, time_period)
+    cache = get_chart_cache()
+    png = cache.get(key)
+    if png is None:
+        n = CHART_PERIODS[time_period]
+        bands = {k: v.tail(n) for k, v in fibonacci_bands(df, window).items()}
+        png = render_fibonacci_png(df.tail(n), bands)
+        cache.put(key, png)
+    return png
+
+def prerender_default_charts(codes):
+    """預先畫好熱門代碼的預設檢視 (3個月, MA5/20/60, Volume+KD)"""
+    time_period, mas, inds = DEFAULT_VIEW
+    for code in codes:
+        try:
+            df, ticker = get_stock_data_v3(code)
+            if df.empty: continue
+            kline_chart(get_indicators(code, ticker, df, view_columns(mas, inds)), ticker, time_period, list(mas), list(inds))
+        except Exception: continue
+
+@st.cache_resource
+def start_chart_prerender():
+    """每個伺服器行程只啟動一次的背景預繪"""
+    worker = threading.Thread(target=prerender_default_charts, args=(POPULAR_CODES,), daemon=True)
+    worker.start()
+    return worker
 
 # ==========================================
-# 5. 核心功能：財務數據
+# 4. 盤中即時更新 (只重跑報價與 K 線圖片段)
 # ==========================================
-@st.cache_data(ttl=86400)
-def get_financial_data(stock_code):
-    metrics = {"PE": "N/A", "EPS": "N/A", "Yield": "N/A", "PB": "N/A"}
-    chart_df = pd.DataFrame()
-    try:
-        ticker = yf.Ticker(f"{stock_code}.TW")
-        info = ticker.info
-        if info:
-            if 'trailingPE' in info: metrics['PE'] = f"{info['trailingPE']:.2f}"
-            if 'trailingEps' in info: metrics['EPS'] = f"{info['trailingEps']:.2f}"
-            if 'dividendYield' in info and info['dividendYield']: metrics['Yield'] = f"{info['dividendYield']*100:.2f}%"
-            if 'priceToBook' in info: metrics['PB'] = f"{info['priceToBook']:.2f}"
-    except: pass
-
-    try:
-        fin_stmt = ticker.quarterly_income_stmt.T
-        if not fin_stmt.empty:
-            rev_col = [c for c in fin_stmt.columns if "Revenue" in str(c) or "Sales" in str(c)]
-            inc_col = [c for c in fin_stmt.columns if "Net Income" in str(c)]
-            if rev_col and inc_col:
-                recent = fin_stmt.head(5).iloc[::-1]
-                chart_df['Revenue'] = recent[rev_col[0]]
-                chart_df['Net Income'] = recent[inc_col[0]]
-                chart_df.index = chart_df.index.strftime('%Y-Q%q') 
-    except: pass
-    return metrics, chart_df
+# 盤中這兩個片段每 QUOTE_INTERVAL 秒自動重跑，資料取自全行程共用的 FEED：
+# 同一檔不論幾個人在看，每個間隔只向上游抓一次；收盤後不自動重跑
+LIVE_EVERY = QUOTE_INTERVAL if is_market_open() else None
+
+def live_bars(stock_code, df):
+    """登記本 session 正在看 stock_code，FEED 有較新的 K 棒就回傳它，否則回傳 df"""
+    ctx = get_script_run_ctx()
+    FEED.watch(stock_code, ctx.session_id if ctx else "local")
+    _, latest = FEED.latest(stock_code)
+    if latest is None or latest.index[-1] < df.index[-1]: return df
+    if latest.index[-1] == df.index[-1] and latest['close'].iloc[-1] == df['close'].iloc[-1]: return df
+    return latest
+
+@st.fragment(run_every=LIVE_EVERY)
+def live_quote(stock_code, name, df):
+    bars = live_bars(stock_code, df)
+    last = bars.iloc[-1]['close']
+    prev = bars.iloc[-2]['close']
+    change = last - prev
+    pct = (change / prev) * 100
+    st.metric(label=f"{name} ({stock_code})", value=f"{last:.2f}", delta=f"{change:.2f} ({pct:.2f}%)")
+
+@st.fragment(run_every=LIVE_EVERY)
+def live_chart(stock_code, ticker, df, time_period, mas, inds):
+    bars = live_bars(stock_code, df)
+    # FEED 抓到的新 K 棒已經推進了 K 棒庫裡的指標引擎：只接上最後一根，對不上才整段重算
+    if bars is not df:
+        extended = extend_indicators(df, bars, load_indicator_state(ticker))
+        df = extended if extended is not None else calculate_indicators(bars, view_columns(mas, inds))
+    try: st.image(kline_chart(df, ticker, time_period, mas, inds))
+    except Exception as e: st.error(f"Error: {e}")
 
 # ==========================================
-# 6. 主程式介面
+# 5. 主程式介面
 # ==========================================
+def show_backtest(bt, equity, rule):
+    r = bt.iloc[0]
+    b1, b2, b3, b4 = st.columns(4)
+    b1.metric("交易次數", f"{int(r['交易次數'])}")
+    b2.metric("勝率", f"{r['勝率']*100:.1f}%" if pd.notna(r['勝率']) else "N/A")
+    b3.metric("總報酬", f"{r['總報酬']*100:.1f}%", delta=f"買進持有 {r['買進持有']*100:.1f}%", delta_color="off")
+    b4.metric("最大回撤", f"{r['最大回撤']*100:.1f}%")
+    st.line_chart(equity.rename(columns={"value": "策略權益"}))
+    st.caption(f"收盤進出場，含手續費 {TRADE_FEE*100:.4f}% 與證交稅 {TRADE_TAX*100:.1f}%；{rule}")
+
+@st.cache_resource
+def start_symbol_refresh():
+    """主檔不存在、只有隨附的種子或已過期時，在背景重建 (每個伺服器行程只檢查一次)"""
+    worker = threading.Thread(target=ensure_symbol_master, daemon=True, name="symbols")
+    worker.start()
+    return worker
+
 st.set_page_config(page_title="股票技術分析儀表板", layout="wide")
 st.title("📈 股票技術分析儀表板")
-
-TAIWAN_STYLE = mpf.make_marketcolors(up='g', down='r', edge='inherit', wick='inherit', volume='inherit')
-TAIWAN_RC = mpf.make_mpf_style(marketcolors=TAIWAN_STYLE)
+run_stages, run_started = METRICS.begin_run()
+start_symbol_refresh()
+start_chart_prerender()
+if METRICS_PORT: start_metrics_server(METRICS_PORT)
 
 col1, col2 = st.columns([1, 2])
 with col1:
     stock_code = st.text_input("輸入代碼", "2330")
 
-try:
-    df, valid_ticker = get_stock_data_v3(stock_code)
-except:
+# 主檔知道市場別時價格與財報同時開抓，財報在背景等著，K 線圖不必等它；
+# 主檔沒登錄的代碼要等價格探測出市場別 (.TW / .TWO) 再抓財報
+price_future = submit_fetch("price", get_stock_data_v3, stock_code)
+symbol = lookup_symbol(stock_code)
+fin_future = submit_fetch("financials", get_financial_data, stock_code, f"{stock_code}{symbol.suffix}") if symbol else None
+with METRICS.timed("wait_price"): df, valid_ticker = fetch_result(price_future, "price", (None, ""))
+if df is None:
     st.error("系統忙碌中")
     df = pd.DataFrame()
+if fin_future is None and valid_ticker: fin_future = submit_fetch("financials", get_financial_data, stock_code, valid_ticker)
 
 with col2:
     if not df.empty:
         name = get_stock_name(stock_code)
-        last = df.iloc[-1]['close']
-        prev = df.iloc[-2]['close']
-        change = last - prev
-        pct = (change / prev) * 100
-        st.metric(label=f"{name} ({stock_code})", value=f"{last:.2f}", delta=f"{change:.2f} ({pct:.2f}%)")
+        live_quote(stock_code, name, df)
     else:
         st.caption("請輸入代碼並按 Enter")
 
 if not df.empty:
-    df = calculate_indicators(df)
-    
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 K線圖", "💡 訊號診斷", "📐 黃金分割", "💰 營收與獲利"]) 
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📊 K線圖", "💡 訊號診斷", "📐 黃金分割", "💰 營收與獲利", "🔎 全市場選股", "🌐 相對強弱"])
 
     with tab1:
         time_period = st.radio("範圍：", ["1個月", "3個月", "半年", "1年"], index=1, horizontal=True)
-        if time_period == "1個月": plot_df = df.tail(20)
-        elif time_period == "3個月": plot_df = df.tail(60)
-        elif time_period == "半年": plot_df = df.tail(120)
-        else: plot_df = df.tail(240)
-
         c1, c2 = st.columns(2)
         with c1: mas = st.multiselect("均線", ["MA5","MA10","MA20","MA60"], ["MA5","MA20","MA60"])
         with c2: inds = st.multiselect("副圖", ["Volume","KD","MACD","RSI","BB","ADX","OBV"], ["Volume","KD"])
 
-        add_plots = []
-        colors = {'MA5':'orange', 'MA10':'cyan', 'MA20':'purple', 'MA60':'green'}
-        for ma in mas:
-            if ma in plot_df.columns: add_plots.append(mpf.make_addplot(plot_df[ma], panel=0, color=colors[ma], width=1.0))
-        
-        if "BB" in inds:
-            add_plots.append(mpf.make_addplot(plot_df['BB_Up'], panel=0, color='red', linestyle='dashed', width=0.5))
-            add_plots.append(mpf.make_addplot(plot_df['BB_Mid'], panel=0, color='gray', linestyle='dashed', width=0.5))
-            add_plots.append(mpf.make_addplot(plot_df['BB_Low'], panel=0, color='green', linestyle='dashed', width=0.5))
-
-        pid = 0
-        vol = False
-        if "Volume" in inds: pid+=1; vol=True
-        if "KD" in inds:
-            pid+=1
-            add_plots.append(mpf.make_addplot(plot_df['K'], panel=pid, color='orange'))
-            add_plots.append(mpf.make_addplot(plot_df['D'], panel=pid, color='blue'))
-        if "MACD" in inds:
-            pid+=1
-            add_plots.append(mpf.make_addplot(plot_df['MACD'], panel=pid, color='red'))
-            add_plots.append(mpf.make_addplot(plot_df['Signal'], panel=pid, color='blue'))
-            add_plots.append(mpf.make_addplot(plot_df['Hist'], type='bar', panel=pid, color='gray', alpha=0.5))
-        if "RSI" in inds:
-            pid+=1
-            add_plots.append(mpf.make_addplot(plot_df['RSI'], panel=pid, color='#9b59b6'))
-            add_plots.append(mpf.make_addplot([70]*len(plot_df), panel=pid, color='gray', linestyle='dashed'))
-            add_plots.append(mpf.make_addplot([30]*len(plot_df), panel=pid, color='gray', linestyle='dashed'))
-        if "ADX" in inds:
-            pid+=1
-            add_plots.append(mpf.make_addplot(plot_df['ADX'], panel=pid, color='blue', title='ADX'))
-            add_plots.append(mpf.make_addplot([25]*len(plot_df), panel=pid, color='orange', linestyle='dashed', width=0.8))
-        if "OBV" in inds:
-            pid+=1
-            add_plots.append(mpf.make_addplot(plot_df['OBV'], panel=pid, color='purple', type='line', title='OBV'))
-
-        try:
-            panel_ratios = tuple([2] + [1] * pid)
-            fig, ax = mpf.plot(plot_df, style=TAIWAN_RC, type='candle', volume=vol, addplot=add_plots, returnfig=True, panel_ratios=panel_ratios, figsize=(10, 8), warn_too_much_data=10000)
-            st.pyplot(fig)
-        except Exception as e: st.error(f"Error: {e}")
+        # 批次已算好 (同一根 K 棒，或只差最後一根而由指標引擎接上) 就直接用；否則只計算目前畫面與訊號分析用得到的指標
+        df = get_indicators(stock_code, valid_ticker, df, view_columns(mas, inds))
+        live_chart(stock_code, valid_ticker, df, time_period, mas, inds)
 
     with tab2:
         st.subheader("🤖 AI 技術指標診斷")
@@ -453,6 +430,9 @@ if not df.empty:
                     st.metric("🛡️ 防守", long_strat['stop_loss'])
                     st.metric("🎯 目標", long_strat['take_profit'])
 
+            with st.expander("📜 歷史回測 (依短線建議進出)"):
+                show_backtest(*backtest_signals(df), "停損停利依每日建議移動。")
+
     with tab3:
         st.subheader("📐 黃金分割率")
         u_fib, s_fib, l_fib = calculate_fibonacci_multi(df)
@@ -467,15 +447,29 @@ if not df.empty:
             st.markdown("#### 🐢 長線 (240日)")
             if l_fib: st.table(pd.DataFrame([{"位置":k, "價格":f"{v:.2f}"} for k,v in l_fib.items()]))
 
+        st.divider()
+        f1, f2 = st.columns(2)
+        with f1: fib_window = st.radio("通道長度 (日)", FIB_WINDOWS, index=1, horizontal=True)
+        with f2: fib_period = st.radio("顯示範圍", list(CHART_PERIODS), index=3, horizontal=True)
+        st.image(fibonacci_chart(df, valid_ticker, fib_window, fib_period))
+        with st.expander(f"📜 黃金分割回測 ({fib_window}日通道)"):
+            show_backtest(*backtest_signals(df, fibonacci_signals(df, fib_window)),
+                          "以前一日的分割價位為準：收盤站回 0.5 進場，跌破 0.382 停損，觸及前波高點 (1.0) 停利。")
+
     with tab4:
         st.subheader(f"💰 {name} ({stock_code}) 營收與獲利概況")
-        metrics, fin_df = get_financial_data(stock_code)
-        
-        m1, m2, m3, m4 = st.columns(4)
+        with st.spinner("載入財報中..."), METRICS.timed("wait_financials"):
+            statements = fetch_result(fin_future, "financials", pd.DataFrame())
+        # 估值用目前的 K 棒即時推算，同業比較讀本地估值快照
+        valuation = get_valuation()
+        metrics, fin_df = financial_metrics(stock_code, statements, df, valuation)
+
+        m1, m2, m3, m4, m5 = st.columns(5)
         m1.metric("本益比 (PE)", metrics['PE'])
-        m2.metric("每股盈餘 (EPS)", metrics['EPS'])
-        m3.metric("殖利率 (Yield)", metrics['Yield'])
+        m2.metric("每股盈餘 (近四季)", metrics['EPS'])
+        m3.metric("殖利率 (近一年)", metrics['Yield'])
         m4.metric("股價淨值比 (PB)", metrics['PB'])
+        m5.metric("PE 產業百分位", metrics['PE 產業百分位'], help="同產業獲利為正的公司 (含自己) 依本益比由低到高的百分位")
         
         st.divider()
         if not fin_df.empty:
@@ -485,7 +479,27 @@ if not df.empty:
             st.bar_chart(fin_df['Net Income'])
         else:
             st.warning("⚠️ 暫時無法獲取圖表數據 (可能是資料源連線問題或 ETF)。")
-            
+
+        if not valuation.empty:
+            valuation_columns = {"industry": "產業", "close": "收盤", "pe": "本益比", "pb": "股價淨值比",
+                                 "dividend_yield": "殖利率", "revenue_yoy": "營收年增率", "net_margin": "淨利率", "period": "最新季"}
+            valuation_format = {"收盤": st.column_config.NumberColumn(format="%.2f"),
+                                "本益比": st.column_config.NumberColumn(format="%.1f"),
+                                "股價淨值比": st.column_config.NumberColumn(format="%.2f"),
+                                "殖利率": st.column_config.NumberColumn(format="percent"),
+                                "營收年增率": st.column_config.NumberColumn(format="percent"),
+                                "淨利率": st.column_config.NumberColumn(format="percent")}
+            info = lookup_symbol(stock_code)
+            if info and info.industry:
+                with st.expander(f"🏭 同產業估值 ({info.industry})"):
+                    peers = valuation[valuation["industry"] == info.industry].sort_values("pe")
+                    st.dataframe(peers[list(valuation_columns)].rename(columns=valuation_columns),
+                                 width="stretch", column_config=valuation_format)
+            with st.expander("🚀 營收年增率前 50 名"):
+                st.dataframe(top_by("revenue_yoy", 50, table=valuation)[list(valuation_columns)].rename(columns=valuation_columns),
+                             width="stretch", column_config=valuation_format)
+            st.caption("同業比較來自本地基本面資料庫 (python -m stock_core fundamentals --universe 匯入)。")
+
         st.divider()
         st.markdown("#### 🔗 詳細財報連結")
         c_l1, c_l2 = st.columns(2)
@@ -495,3 +509,90 @@ if not df.empty:
         with c_l2:
             url_cmoney = f"https://www.cmoney.tw/forum/stock/{stock_code}"
             st.link_button("👉 CMoney (股市同學會)", url_cmoney)
+
+    with tab5:
+        st.subheader("🔎 全市場選股")
+        universe = universe_tickers()
+        c_s1, c_s2 = st.columns([3, 1])
+        universe_update = get_universe_update()
+        with c_s2:
+            if not universe_update.running() and st.button("🔄 背景更新全市場 K 棒"): universe_update.start(universe)
+            if universe_update.running():
+                st.progress(universe_update.done / max(universe_update.total, 1),
+                            text=f"K 棒更新中 {universe_update.done}/{universe_update.total} (失敗 {universe_update.counts['failed']})")
+            elif universe_update.finished:
+                st.caption(f"K 棒更新完成：成功 {universe_update.counts['ok']}、失敗 {universe_update.counts['failed']}")
+        result = screen_universe(tuple(universe))
+        if result.empty:
+            st.info("本地 K 棒庫尚無足夠資料，請先更新全市場 K 棒 (或執行 python -m stock_core bars --universe，一小時內生效)。")
+        else:
+            with c_s1:
+                screen_mode = st.radio("篩選：", ["全部", "高分 (≥80)", "均線金叉", "ADX 突破 25"], horizontal=True)
+            if screen_mode == "高分 (≥80)": result = result[result["分數"] >= 80]
+            elif screen_mode == "均線金叉": result = result[result["均線金叉"]]
+            elif screen_mode == "ADX 突破 25": result = result[result["ADX突破25"]]
+            st.caption(f"共 {len(result)} 檔 (依分數排序，可點欄位重新排序)")
+            st.dataframe(result, width="stretch", column_config={
+                "收盤": st.column_config.NumberColumn(format="%.2f"),
+                "漲跌%": st.column_config.NumberColumn(format="%.2f"),
+                "ADX": st.column_config.NumberColumn(format="%.1f"),
+                "量比": st.column_config.NumberColumn(format="%.2f")})
+
+    with tab6:
+        st.subheader("🌐 相對強弱與相關性")
+        r1, r2 = st.columns(2)
+        with r1: rs_scope = st.radio("範圍：", ["自選清單", "全市場 (本地 K 棒庫)"], horizontal=True)
+        with r2: rs_window = st.radio("報酬區間 (日)", [20, 60, 120], index=1, horizontal=True)
+        if rs_scope == "自選清單":
+            watch = [f"{code}{info.suffix if (info := lookup_symbol(code)) else '.TW'}" for code in POPULAR_CODES]
+            rs_tickers = tuple(dict.fromkeys([*watch, valid_ticker]))
+        else:
+            rs_tickers = tuple(universe_tickers())
+        market = get_market_matrix(rs_tickers)
+        with METRICS.timed("market_matrix"): market.refresh()
+        rs = market.relative_strength(rs_window)
+        if rs[f"{rs_window}日報酬"].notna().sum() == 0:
+            st.info("本地 K 棒庫尚無足夠資料 (自選清單會在瀏覽時寫入；全市場請先在「全市場選股」更新 K 棒)。")
+        else:
+            if valid_ticker in rs.index:
+                mine = rs.loc[valid_ticker]
+                pct = lambda v: f"{v*100:.1f}%" if pd.notna(v) else "N/A"
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric(f"{rs_window}日報酬", pct(mine[f"{rs_window}日報酬"]))
+                k2.metric(f"相對大盤 ({BENCHMARK})", pct(mine["相對大盤"]))
+                k3.metric("相對產業", pct(mine["相對產業"]), help="相對同產業等權平均的超額報酬")
+                k4.metric("RS百分位", f"{mine['RS百分位']:.0f}" if pd.notna(mine['RS百分位']) else "N/A")
+            pct_format = st.column_config.NumberColumn(format="percent")
+            st.dataframe(rs.sort_values("RS百分位", ascending=False), width="stretch", column_config={
+                f"{rs_window}日報酬": pct_format, "相對大盤": pct_format, "相對產業": pct_format,
+                "RS百分位": st.column_config.NumberColumn(format="%.0f"),
+                "產業內百分位": st.column_config.NumberColumn(format="%.0f")})
+
+            st.markdown(f"#### 🔗 近 {market.corr.window} 日報酬相關係數")
+            if rs_scope == "自選清單":
+                corr = market.correlation(rs_tickers)
+                st.dataframe(corr.style.background_gradient(cmap="RdYlGn", vmin=-1, vmax=1).format("{:.2f}"),
+                             width="stretch")
+            elif valid_ticker in market.tickers:
+                top = market.top_correlated(valid_ticker, 20)
+                names = [get_stock_name(t.split('.')[0]) for t in top.index]
+                st.dataframe(pd.DataFrame({"名稱": names, "相關係數": top}), width="stretch",
+                             column_config={"相關係數": st.column_config.NumberColumn(format="%.2f")})
+            else:
+                st.info(f"{valid_ticker} 不在本地 K 棒庫的全市場清單中。")
+            st.caption("收盤取自本地 K 棒庫 (與 K 線圖同一份資料)；停牌日不計入相關係數。")
+
+METRICS.end_run(run_stages, run_started, code=stock_code)
+if st.sidebar.toggle("🛠 效能除錯"):
+    snap = METRICS.snapshot()
+    st.sidebar.markdown("**本次 rerun 各階段 (毫秒)**")
+    st.sidebar.dataframe(pd.Series(run_stages, name="ms").mul(1000).round(1))
+    st.sidebar.markdown("**累計各階段**")
+    st.sidebar.dataframe(pd.DataFrame(snap["stages"]).T.assign(avg=lambda t: t["total"] / t["count"]).round(4))
+    st.sidebar.markdown("**快取命中**")
+    caches = dict(snap["caches"])
+    for source in ("chart_cache", "cache_backend", "quote_feed"):
+        if source in snap: caches[source] = snap[source]
+    st.sidebar.dataframe(pd.DataFrame(caches).T)
+    st.sidebar.markdown("**上游呼叫**")
+    st.sidebar.dataframe(pd.DataFrame(snap["upstream"]).T)
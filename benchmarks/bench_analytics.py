@@ -0,0 +1,166 @@
+"""分析函式效能基準 (完全離線，yfinance 以 fake_yfinance 取代)
+
+    python -m benchmarks.bench_analytics                    # 與 baseline.json 比較，退步即以非 0 結束
+    python -m benchmarks.bench_analytics --update-baseline  # 以本次結果覆寫基準
+    python -m benchmarks.bench_analytics --quick            # 只跑小尺寸
+
+每項先暖身一次 (延遲匯入、JIT 編譯、檔案快取)，記錄之後多次執行中最快的牆鐘時間，以及另跑一次 tracemalloc 取得的記憶體峰值。
+時間超出容忍度的項目會以三倍次數重測一次，仍然超出才算退步；差距在 --time-floor 以內的不算 (毫秒級項目的雜訊)。
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = [500, 10_000, 100_000, 1_000_000]
+QUICK_SIZES = [500, 10_000]
+BATCHES = [(500, 200), (500, 2000)]
+QUICK_BATCHES = [(500, 100)]
+
+def load_core():
+    """離線載入 stock_core：假 yfinance + 暫存資料目錄 (不需 Streamlit)"""
+    from benchmarks import fake_yfinance
+    os.environ["STOCK_DATA_DIR"] = tempfile.mkdtemp(prefix="stock-bench-")
+    fake_yfinance.install()
+    sys.path.insert(0, ROOT)
+    import stock_core
+    return stock_core
+
+def cases(core, sizes, batches):
+    from benchmarks.fake_yfinance import synthetic_ohlcv, synthetic_panel
+    for n in sizes:
+        df = synthetic_ohlcv(n, seed=n, freq="min")
+        ind = core.calculate_indicators(df)
+        yield f"calculate_indicators[{n}]", lambda df=df: core.calculate_indicators(df)
+        yield f"calculate_score[{n}]", lambda ind=ind: core.calculate_score(ind)
+        yield f"analyze_signals[{n}]", lambda ind=ind: core.analyze_signals(ind)
+        yield f"generate_dual_strategy[{n}]", lambda ind=ind: core.generate_dual_strategy(ind)
+        yield f"calculate_fibonacci_multi[{n}]", lambda ind=ind: core.calculate_fibonacci_multi(ind)
+        yield f"backtest_signals[{n}]", lambda ind=ind: core.backtest_signals(ind)
+        yield f"fibonacci_bands[{n}]", lambda ind=ind: [core.fibonacci_bands(ind, w) for w in core.FIB_WINDOWS]
+        yield f"backtest_fibonacci[{n}]", lambda ind=ind: core.backtest_signals(ind, core.fibonacci_signals(ind))
+    for n_rows, n_symbols in batches:
+        panel = synthetic_panel(n_rows, n_symbols)
+        yield f"calculate_indicators_panel[{n_rows}x{n_symbols}]", lambda p=panel: core.calculate_indicators_panel(p, core.SIGNAL_COLUMNS)
+        ind = core.calculate_indicators_panel(panel, core.SIGNAL_COLUMNS)
+        yield f"screen_panel[{n_rows}x{n_symbols}]", lambda ind=ind: core.screen_panel(ind)
+        # 參數最佳化：指標共用，每組參數只重跑門檻與回測
+        from stock_core.optimize import prepare_panel
+        params = core.param_samples(8, seed=0)
+        shared = prepare_panel(panel, params)
+        yield f"optimize_evaluate[{n_rows}x{n_symbols}x8]", lambda s=shared: [core.evaluate(s, p) for p in params]
+        # 跨股相關：整窗建立 + 取矩陣，以及盤中取代最後一天的增量更新
+        returns = core.daily_returns(panel['close'])
+        yield f"rolling_correlation[{n_symbols}]", lambda r=returns: core.RollingCorrelation(r).matrix()
+        corr = core.RollingCorrelation(returns)
+        yield f"rolling_correlation_update[{n_symbols}]", lambda c=corr, row=returns.iloc[-1]: c.update(row, replace=True)
+
+    def fetch_cold():
+        core.delete_bars("2330.TW")
+        return core.fetch_stock_data("2330")
+    yield "fetch_stock_data[cold]", fetch_cold
+    yield "fetch_stock_data[warm]", lambda: core.fetch_stock_data("2330")
+
+    # 基本面資料庫：2000 檔各 12 季寫入後的橫斷面查詢 (不經上游)
+    import numpy as np
+    import pandas as pd
+    periods = pd.date_range(end="2025-12-31", periods=12, freq="QE", name="period")
+    for i in range(2000):
+        growth = np.linspace(1.0, 1.0 + (i % 40) / 100, 12)
+        core.save_statements(str(1000 + i), pd.DataFrame({
+            "revenue": 1e9 * growth, "net_income": 1e8 * growth, "eps": (1 + i % 7) * growth,
+            "equity": np.full(12, 5e9), "shares": np.full(12, 1e8)}, index=periods))
+    yield "refresh_valuation[2000]", core.refresh_valuation
+    yield "valuation_queries[2000]", lambda: (core.sector_percentile("pe"), core.top_by("revenue_yoy", 50))
+
+    # 結果快取後端：同一筆 K 棒表的寫入 + 讀回
+    from stock_core import cache
+    from benchmarks.fake_redis import FakeRedis
+    bars = synthetic_ohlcv(500)
+    backends = {"memory": cache.MemoryBackend(),
+                "sqlite": cache.SQLiteBackend(os.path.join(os.environ["STOCK_DATA_DIR"], "cache.sqlite")),
+                "redis": cache.RedisBackend(FakeRedis())}
+    for label, backend in backends.items():
+        def round_trip(backend=backend):
+            cache.set_backend(backend)
+            fn = cache.cached("bench", 60)(lambda code: bars)
+            fn.clear()
+            return fn("2330"), fn("2330")
+        yield f"cache_round_trip[{label}]", round_trip
+
+def measure(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+def slower(r, base, time_tol, time_floor):
+    """超過基準 (1 + 容忍度) 倍，且絕對差距超過 time_floor 秒"""
+    return r["seconds"] > base["seconds"] * (1 + time_tol) and r["seconds"] - base["seconds"] > time_floor
+
+def compare(results, baseline, time_tol, mem_tol, time_floor=0.02):
+    """超過基準 (1 + 容忍度) 倍且絕對差距不可忽略者視為退步"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None: continue
+        if slower(r, base, time_tol, time_floor):
+            regressions.append(f"{name}: {base['seconds']*1000:.1f} ms -> {r['seconds']*1000:.1f} ms")
+        if r["peak_bytes"] > base["peak_bytes"] * (1 + mem_tol) and r["peak_bytes"] - base["peak_bytes"] > 1 << 20:
+            regressions.append(f"{name}: peak {base['peak_bytes']/2**20:.1f} MB -> {r['peak_bytes']/2**20:.1f} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="只跑小尺寸")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="允許的時間退步比例 (預設 50%%)")
+    parser.add_argument("--time-floor", type=float, default=0.02, help="時間差距在此秒數以內不算退步 (預設 0.02)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.2, help="允許的記憶體退步比例 (預設 20%%)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("-k", dest="match", default="", help="只跑名稱含此字串的項目")
+    args = parser.parse_args(argv)
+
+    core = load_core()
+    sizes, batches = (QUICK_SIZES, QUICK_BATCHES) if args.quick else (SIZES, BATCHES)
+    results, fns = {}, {}
+    for name, fn in cases(core, sizes, batches):
+        if args.match not in name: continue
+        results[name], fns[name] = measure(fn, args.repeat), fn
+        print(f"{name:<45} {results[name]['seconds']*1000:>10.2f} ms {results[name]['peak_bytes']/2**20:>10.1f} MB", flush=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    # 單次量測可能碰上背景負載，疑似退步的先重測確認
+    for name in [n for n in results if n in baseline and slower(results[n], baseline[n], args.time_tolerance, args.time_floor)]:
+        retry = measure(fns[name], args.repeat * 3)
+        results[name]["seconds"] = min(results[name]["seconds"], retry["seconds"])
+        print(f"{name:<45} {results[name]['seconds']*1000:>10.2f} ms (重測)", flush=True)
+    regressions = compare(results, baseline, args.time_tolerance, args.mem_tolerance, args.time_floor)
+    for line in regressions: print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""離線用的 Redis 替身：只實作 RedisBackend 用到的指令 (get / set ex / delete / scan_iter / dbsize)"""
+import fnmatch
+import threading
+import time
+
+class FakeRedis:
+    def __init__(self):
+        self._data = {}  # key -> (到期時間或 None, 值)
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item is not None and item[0] is not None and item[0] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key)
+            return None if item is None else item[1]
+
+    def set(self, key, value, ex=None):
+        with self._lock: self._data[key] = (None if ex is None else time.time() + ex, bytes(value))
+        return True
+
+    def delete(self, *keys):
+        with self._lock: return sum(self._data.pop(k, None) is not None for k in keys)
+
+    def scan_iter(self, match="*"):
+        with self._lock: keys = [k for k in list(self._data) if self._alive(k) and fnmatch.fnmatchcase(k, match)]
+        yield from keys
+
+    def dbsize(self):
+        with self._lock: return sum(1 for k in list(self._data) if self._alive(k))
@@ -0,0 +1,67 @@
+"""離線用的假 yfinance：依代碼產生固定的合成 K 棒與財報，完全不連網"""
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+FIXTURE_DAYS = 1500
+FIXTURE_END = "2025-12-31"
+
+def synthetic_ohlcv(n_rows, seed=0, freq="B", end=FIXTURE_END):
+    """隨機漫步的 OHLCV (小寫欄位、無時區)，與 fetch_stock_data 回傳的格式相同"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(end=end, periods=n_rows, freq=freq, name='date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_rows)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_rows))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n_rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n_rows)))
+    volume = rng.integers(1_000, 100_000, n_rows).astype(float)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'adj close': close,
+                         'volume': volume, 'dividends': 0.0, 'stock splits': 0.0}, index=index)
+
+def synthetic_panel(n_rows, n_symbols, seed=0):
+    """n_symbols 檔對齊的寬表 {欄位: 日期 × 代碼}，供批次函式使用"""
+    frames = {f"S{i:04d}": synthetic_ohlcv(n_rows, seed=seed + i) for i in range(n_symbols)}
+    return {f: pd.DataFrame({t: d[f] for t, d in frames.items()}) for f in ['open', 'high', 'low', 'close', 'volume']}
+
+class FakeTicker:
+    """yf.Ticker 的替身：history / info / quarterly_income_stmt 都由代碼決定的固定資料回應"""
+    calls = []
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.seed = zlib.crc32(ticker.split(".")[0].encode())
+
+    def history(self, period=None, start=None, end=None, auto_adjust=True, **kwargs):
+        FakeTicker.calls.append((self.ticker, "history"))
+        df = synthetic_ohlcv(FIXTURE_DAYS, seed=self.seed)
+        if start is not None: df = df[df.index >= pd.Timestamp(start)]
+        elif period and period.endswith("d"): df = df.tail(int(period[:-1]))
+        df.columns = [c.title() for c in df.columns]
+        df.index = df.index.tz_localize("Asia/Taipei")
+        return df
+
+    @property
+    def info(self):
+        FakeTicker.calls.append((self.ticker, "info"))
+        return {"trailingPE": 15.0, "trailingEps": 10.0, "dividendYield": 0.03, "priceToBook": 2.0}
+
+    @property
+    def quarterly_income_stmt(self):
+        FakeTicker.calls.append((self.ticker, "quarterly_income_stmt"))
+        periods = pd.date_range(end=FIXTURE_END, periods=6, freq="QE")[::-1]
+        base = 1e9 * (1 + self.seed % 50)
+        return pd.DataFrame({"Total Revenue": base * np.linspace(1.2, 1.0, 6),
+                             "Net Income": base * 0.1 * np.linspace(1.2, 1.0, 6)}, index=periods).T
+
+    @property
+    def quarterly_balance_sheet(self):
+        FakeTicker.calls.append((self.ticker, "quarterly_balance_sheet"))
+        periods = pd.date_range(end=FIXTURE_END, periods=6, freq="QE")[::-1]
+        shares = 1e8 * (1 + self.seed % 50)
+        return pd.DataFrame({"Stockholders Equity": shares * 50 * np.linspace(1.1, 1.0, 6),
+                             "Ordinary Shares Number": np.full(6, shares)}, index=periods).T
+
+def install():
+    yf.Ticker = FakeTicker
@@ -0,0 +1,53 @@
+"""股票分析核心：抓取、指標、策略、回測與選股，不依賴 Streamlit
+
+儀表板、排程與批次程式共用同一套函式。子模組延遲載入，`import stock_core` 本身幾乎不花時間；
+yfinance 等重套件要到第一次抓資料時才載入。
+
+    python -m stock_core batch 2330 2317 --out data/results
+"""
+import importlib
+
+# 公開名稱 -> 所在子模組
+_EXPORTS = {
+    "DATA_DIR": "config", "RESULTS_DIR": "config",
+    "Metrics": "metrics", "METRICS": "metrics",
+    "UpstreamError": "upstream", "UpstreamClient": "upstream", "UPSTREAM": "upstream",
+    "BAR_COLUMNS": "bars", "load_bars": "bars", "save_bars": "bars", "delete_bars": "bars",
+    "update_bars": "bars", "fetch_stock_data": "bars", "load_bars_panel": "bars", "panel_by_date": "bars",
+    "SymbolInfo": "symbols", "load_symbol_master": "symbols", "refresh_symbol_master": "symbols",
+    "lookup_symbol": "symbols", "candidate_suffixes": "symbols", "get_stock_name": "symbols",
+    "ensure_symbol_master": "symbols",
+    "INDICATORS": "indicators", "INDICATOR_COLUMNS": "indicators", "SIGNAL_COLUMNS": "indicators",
+    "CHART_COLUMNS": "indicators", "view_columns": "indicators", "calculate_indicators": "indicators",
+    "calculate_indicators_panel": "indicators",
+    "IndicatorEngine": "engine", "extend_indicators": "engine", "load_indicator_state": "bars",
+    "calculate_score": "strategy", "analyze_volume": "strategy", "analyze_signals": "strategy",
+    "generate_dual_strategy": "strategy", "calculate_fibonacci_multi": "strategy",
+    "FIB_WINDOWS": "strategy", "fibonacci_bands": "strategy",
+    "StrategyParams": "strategy", "DEFAULT_PARAMS": "strategy", "with_params": "strategy",
+    "rolling_extreme": "extrema", "WindowExtrema": "extrema",
+    "SHORT_ACTIONS": "backtest", "LONG_ACTIONS": "backtest", "TRADE_FEE": "backtest", "TRADE_TAX": "backtest",
+    "strategy_signals": "backtest", "fibonacci_signals": "backtest", "backtest_signals": "backtest", "backtest_universe": "backtest",
+    "screen_panel": "screener", "universe_tickers": "screener", "update_universe_bars": "screener",
+    "screen_tickers": "screener", "sector_tickers": "screener",
+    "PARAM_SPACE": "optimize", "param_grid": "optimize", "param_samples": "optimize",
+    "evaluate": "optimize", "rank_results": "optimize", "run_optimization": "optimize",
+    "fetch_statements": "financials", "save_statements": "financials", "load_statements": "financials",
+    "get_statements": "financials", "ingest_fundamentals": "financials", "refresh_valuation": "financials",
+    "load_valuation": "financials", "valuation_metrics": "financials", "sector_percentile": "financials",
+    "top_by": "financials", "financial_metrics": "financials",
+    "BENCHMARK": "market", "close_matrix": "market", "daily_returns": "market", "window_returns": "market",
+    "relative_strength": "market", "RollingCorrelation": "market", "MarketMatrix": "market",
+    "analyze_ticker": "batch", "load_indicators": "batch", "run_batch": "batch", "load_precomputed": "batch", "load_summary": "batch",
+}
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,131 @@
+"""命令列入口：python -m stock_core <指令>"""
+import argparse
+import sys
+import time
+
+def _progress(i, n):
+    print(f"\r{i}/{n}", end="" if i < n else "\n", file=sys.stderr, flush=True)
+
+def _optimize(parser, args):
+    import pandas as pd
+    from .optimize import param_grid, param_samples, run_optimization
+    from .screener import sector_tickers, universe_tickers
+    tickers = list(args.codes)
+    if args.sector: tickers += sector_tickers(args.sector)
+    if args.universe: tickers += universe_tickers()
+    if not tickers: parser.error("沒有代碼：請給代碼、--sector 或 --universe")
+    choices = {}
+    for item in args.set:
+        name, _, values = item.partition("=")
+        choices[name.strip()] = [float(v) if "." in v else int(v) for v in values.split(",")]
+    params = param_grid(**choices) if args.grid else param_samples(args.samples, args.seed, **choices)
+
+    start = time.perf_counter()
+    table = run_optimization(tickers, params, args.start, args.end, args.workers, args.sort, progress=_progress)
+    if table.empty:
+        print("本地 K 棒不足 (請先以儀表板或 batch 抓取)", file=sys.stderr)
+        return 1
+    print(f"{len(table)} 組參數 × {len(dict.fromkeys(tickers))} 檔，耗時 {time.perf_counter() - start:.1f} 秒")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.head(args.top).to_string())
+    if args.out: table.to_csv(args.out)
+    return 0
+
+def _fundamentals(parser, args):
+    from .financials import ingest_fundamentals, refresh_valuation
+    if args.refresh_only:
+        print(f"{refresh_valuation()} 檔估值已更新")
+        return 0
+    codes = list(args.codes)
+    if args.universe:
+        from .screener import universe_tickers
+        codes += [t.split(".")[0] for t in universe_tickers(types=("股票",))]
+    if not codes: parser.error("沒有代碼：請給代碼或 --universe")
+    start = time.perf_counter()
+    counts = ingest_fundamentals(codes, args.max_age, args.workers, progress=_progress)
+    print(f"完成 {counts['ok']}、無季報 {counts['empty']}、失敗 {counts['failed']}、略過 {counts['skipped']}，"
+          f"耗時 {time.perf_counter() - start:.1f} 秒")
+    return 0 if counts["failed"] < len(codes) else 1
+
+def _bars(parser, args):
+    from .bars import fetch_stock_data
+    from .screener import universe_tickers, update_universe_bars
+    if not args.codes and not args.universe: parser.error("沒有代碼：請給代碼或 --universe")
+    start = time.perf_counter()
+    for code in args.codes: fetch_stock_data(code)
+    if args.universe:
+        counts = update_universe_bars(universe_tickers(), progress=_progress)
+        print(f"成功 {counts['ok']}、失敗 {counts['failed']}", end="，")
+    print(f"K 棒已更新，耗時 {time.perf_counter() - start:.1f} 秒")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m stock_core", description="股票分析批次工具 (不需 Streamlit)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch = sub.add_parser("batch", help="多檔並行計算指標、評分與建議，寫成 Parquet/CSV")
+    batch.add_argument("codes", nargs="*", help="股票代碼 (不含 .TW / .TWO)")
+    batch.add_argument("--file", help="代碼清單檔，每行一個")
+    batch.add_argument("--universe", action="store_true", help="主檔內全部股票與 ETF")
+    batch.add_argument("--out", help="輸出目錄 (預設 <資料目錄>/results)")
+    batch.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    batch.add_argument("--workers", type=int, help="行程數 (預設 min(4, CPU 數))；1 表示不開行程池")
+    opt = sub.add_parser("optimize", help="掃描評分與策略門檻，依回測報酬與風險排序 (讀本地 K 棒庫)")
+    opt.add_argument("codes", nargs="*", help="市場代碼 (含 .TW / .TWO)")
+    opt.add_argument("--sector", help="主檔中的產業別，例如 半導體業")
+    opt.add_argument("--universe", action="store_true", help="主檔內全部股票與 ETF")
+    opt.add_argument("--samples", type=int, default=500, help="隨機抽樣組數 (預設 500)")
+    opt.add_argument("--grid", action="store_true", help="改為窮舉全部組合")
+    opt.add_argument("--set", action="append", default=[], metavar="名稱=值,值",
+                     help="覆寫某個參數的候選值，例如 --set adx_min=20,25 (可重複)")
+    opt.add_argument("--start", help="回測起日 (指標仍以更早的資料暖機)")
+    opt.add_argument("--end", help="回測迄日")
+    opt.add_argument("--sort", default="夏普值", choices=["夏普值", "報酬回撤比", "組合年化報酬", "平均總報酬"])
+    opt.add_argument("--top", type=int, default=20, help="顯示前幾名")
+    opt.add_argument("--out", help="完整結果寫成 CSV")
+    opt.add_argument("--workers", type=int, help="行程數 (預設 CPU 數)；1 表示不開行程池")
+    opt.add_argument("--seed", type=int, default=0)
+    fund = sub.add_parser("fundamentals", help="批次匯入季報到本地基本面資料庫並重算估值快照")
+    fund.add_argument("codes", nargs="*", help="股票代碼 (不含 .TW / .TWO)")
+    fund.add_argument("--universe", action="store_true", help="主檔內全部股票")
+    fund.add_argument("--max-age", type=int, default=30, help="幾天內匯入過的略過 (預設 30)；0 表示全部重抓")
+    fund.add_argument("--workers", type=int, default=4, help="同時送出的請求數 (速率仍受限流控制)")
+    fund.add_argument("--refresh-only", action="store_true", help="不抓上游，只以本地季報與 K 棒重算估值")
+    bars = sub.add_parser("bars", help="增量更新本地 K 棒庫 (選股、回測、最佳化與相對強弱都讀它)")
+    bars.add_argument("codes", nargs="*", help="股票代碼 (不含 .TW / .TWO)")
+    bars.add_argument("--universe", action="store_true", help="主檔內全部股票與 ETF")
+    sub.add_parser("symbols", help="重新下載上市櫃主檔")
+    args = parser.parse_args(argv)
+    # 全市場 / 產業清單都取自主檔：過期或只有隨附的種子清單時先重建
+    if getattr(args, "universe", False) or getattr(args, "sector", None):
+        from .symbols import ensure_symbol_master
+        ensure_symbol_master()
+
+    if args.command == "fundamentals": return _fundamentals(parser, args)
+
+    if args.command == "optimize": return _optimize(parser, args)
+
+    if args.command == "bars": return _bars(parser, args)
+
+    if args.command == "symbols":
+        from .symbols import refresh_symbol_master
+        print(f"{len(refresh_symbol_master())} symbols")
+        return 0
+
+    from .batch import run_batch
+    from .config import RESULTS_DIR
+    codes = list(args.codes)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f: codes += [line.strip() for line in f if line.strip()]
+    if args.universe:
+        from .screener import universe_tickers
+        codes += [t.split(".")[0] for t in universe_tickers()]
+    if not codes: parser.error("沒有代碼：請給代碼、--file 或 --universe")
+
+    start = time.perf_counter()
+    summary = run_batch(codes, args.out or RESULTS_DIR, args.format, args.workers, progress=_progress)
+    done = int((summary["狀態"] == "完成").sum())
+    print(f"{done}/{len(summary)} 完成，耗時 {time.perf_counter() - start:.1f} 秒 -> {args.out or RESULTS_DIR}")
+    return 0 if done else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""歷史回測 (每根 K 棒的評分與建議一次算完)"""
+import numpy as np
+import pandas as pd
+
+from .bars import load_bars_panel
+from .indicators import SIGNAL_COLUMNS, calculate_indicators_panel
+from .strategy import DEFAULT_PARAMS, _checklist_rules, _score_rules, fibonacci_bands, with_params
+
+SHORT_ACTIONS = ["觀望", "現價佈局", "拉回佈局", "分批獲利", "反彈減碼"]
+LONG_ACTIONS = ["續抱", "波段續抱", "保守應對"]
+TRADE_FEE, TRADE_TAX = 0.001425, 0.003
+
+def _as_panel(ind):
+    """單檔指標表轉成單欄寬表，讓單檔與多檔走同一套矩陣運算"""
+    if isinstance(ind, pd.DataFrame): return {c: ind[c].to_frame("value") for c in ind.columns}
+    return ind
+
+def _like(template, values):
+    return pd.DataFrame(values, index=template.index, columns=template.columns)
+
+def bbw_quantile(p, q):
+    """近 60 根 BBW 的 q 分位數 (逐列)；p 裡已有 BBW_Q{q} (參數最佳化時預先算好共用) 就直接用"""
+    name = f'BBW_Q{q:g}'
+    return p[name] if name in p else p['BBW'].rolling(60, min_periods=1).quantile(q)
+
+def strategy_signals(ind, params=DEFAULT_PARAMS):
+    """generate_dual_strategy 的整段歷史版本：每一列等同只用到該日為止的資料呼叫一次"""
+    p = with_params(_as_panel(ind), params)
+    close, ma20, ma60 = p['close'], p['MA20'], p['MA60']
+    score = _score_rules(p, {'close': close.shift(1)}, bbw_quantile(p, params.bbw_quantile), params)
+
+    # 短線：與 generate_dual_strategy 相同的判斷順序
+    burst = score >= params.burst_score
+    bull = ~burst & (close > ma20) & (p['K'] < params.k_max)
+    hot = bull & (p['RSI'] > params.rsi_hot)
+    bear = ~burst & ~bull & (close < ma20)
+    short_action = np.select([burst, hot, bull, bear], [1, 3, 2, 4], 0).astype(np.int8)
+    tp_short = p['BB_Up'].mask(bear, ma20)
+
+    # 長線
+    long_action = np.select([close > ma60, close < ma60], [1, 2], 0).astype(np.int8)
+    high120 = p['High120'] if 'High120' in p else p['high'].rolling(120, min_periods=1).max()
+    tp_long = high120.mask(close < ma60, ma60)
+
+    # 不足 60 根時 generate_dual_strategy 不給建議 (從各檔第一根有收盤的 K 棒起算)
+    valid = close.notna().cummax().cumsum() >= 60
+    signals = {"score": score.where(valid), "short_action": _like(close, short_action).where(valid, -1),
+               "stop_loss_short": ma20, "take_profit_short": tp_short,
+               "long_action": _like(close, long_action).where(valid, -1),
+               "stop_loss_long": ma60, "take_profit_long": tp_long}
+    signals.update(_checklist_rules(p))
+    return signals
+
+def fibonacci_signals(ind, window=60):
+    """黃金分割通道策略，格式同 strategy_signals 的短線欄位，可直接交給 backtest_signals：
+    以前一日的 window 日分割價位為準，收盤由下往上站回 0.5 進場，跌破 0.382 停損，觸及前波高點 (1.0) 停利"""
+    p = _as_panel(ind)
+    close = p['close']
+    bands = {k: v.shift(1) for k, v in fibonacci_bands(p, window).items()}
+    mid = bands['0.5']
+    cross = (close > mid) & (close.shift(1) <= mid.shift(1))
+    return {"short_action": _like(close, np.where(cross, 2, 0).astype(np.int8)),
+            "stop_loss_short": bands['0.382'], "take_profit_short": bands['1.0 (高)']}
+
+def backtest_signals(ind, signals=None, fee=TRADE_FEE, tax=TRADE_TAX):
+    """依短線建議模擬交易：出現「現價/拉回佈局」收盤進場，收盤跌破停損或觸及停利出場。
+    停損停利跟著每日建議移動；同一根同時有進出場訊號時以進場為準。回傳每檔一列的績效表。"""
+    p = _as_panel(ind)
+    sig = signals if signals is not None else strategy_signals(p)
+    close = p['close']
+    action = sig['short_action']
+    entry = action.isin([1, 2])
+    exit_ = (close < sig['stop_loss_short']) | (close >= sig['take_profit_short']) | (action == 4)
+    state = _like(close, np.where(entry, 1.0, np.where(exit_, 0.0, np.nan)))
+    pos = state.ffill().fillna(0.0)
+    prev_pos = pos.shift(1).fillna(0.0)
+    entered, exited = (pos > prev_pos), (pos < prev_pos)
+    # 寬表以日期對齊時某檔沒有 K 棒的日子收盤為 NaN：沿用前一個收盤，缺口的漲跌算在下一根
+    ret = prev_pos * close.ffill().pct_change().fillna(0.0) - fee * entered - (fee + tax) * exited
+    equity = (1 + ret).cumprod()
+
+    # 逐筆交易報酬：以進出場當根的權益比值計算，期末未平倉以最後一根結算
+    eq = equity.to_numpy()
+    ent_mask = entered.to_numpy().copy()
+    ex_mask = exited.to_numpy().copy()
+    ex_mask[-1] |= pos.to_numpy()[-1] > 0
+    n_rows, n_cols = eq.shape
+    ent_idx, ex_idx = np.flatnonzero(ent_mask.T), np.flatnonzero(ex_mask.T)
+    eq_flat = eq.T.ravel()
+    base_idx = np.maximum(ent_idx - 1, (ent_idx // n_rows) * n_rows)
+    trade_ret = eq_flat[ex_idx] / eq_flat[base_idx] - 1
+    owner = ent_idx // n_rows
+    trades = np.bincount(owner, minlength=n_cols)
+    wins = np.bincount(owner, weights=trade_ret > 0, minlength=n_cols)
+
+    # 年化與持倉比例以各檔自己上市 (第一根有收盤) 以來的列數計算
+    listed = close.notna().cummax().sum().to_numpy()
+    years = np.maximum(listed / 252, 1 / 252)
+    total = equity.iloc[-1] - 1
+    return pd.DataFrame({
+        "交易次數": trades,
+        "勝率": np.where(trades > 0, wins / np.maximum(trades, 1), np.nan),
+        "平均每筆報酬": np.bincount(owner, weights=trade_ret, minlength=n_cols) / np.where(trades > 0, trades, np.nan),
+        "總報酬": total.to_numpy(),
+        "年化報酬": ((1 + total) ** (1 / years) - 1).to_numpy(),
+        "最大回撤": (equity / equity.cummax() - 1).min().to_numpy(),
+        "持倉比例": pos.sum().to_numpy() / np.maximum(listed, 1),
+        "買進持有": (close.iloc[-1] / close.bfill().iloc[0] - 1).to_numpy(),
+    }, index=close.columns), equity
+
+def backtest_universe(tickers, chunk=200):
+    """全市場回測：分批載入以控制記憶體，每批一次矩陣運算"""
+    results = []
+    for i in range(0, len(tickers), chunk):
+        panel = load_bars_panel(list(tickers[i:i + chunk]), by_bar=True)
+        if not panel or len(panel['close']) < 60: continue
+        results.append(backtest_signals(calculate_indicators_panel(panel, SIGNAL_COLUMNS))[0])
+    return pd.concat(results) if results else pd.DataFrame()
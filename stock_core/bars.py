@@ -0,0 +1,184 @@
+"""K 棒資料：本地 SQLite K 棒庫與增量抓取"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+from .engine import IndicatorEngine
+from .metrics import METRICS
+from .symbols import candidate_suffixes
+from .upstream import UPSTREAM, UpstreamError
+
+BAR_DB = os.path.join(DATA_DIR, "bars.sqlite")
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'adj close', 'volume', 'dividends', 'stock splits']
+
+def _connect_bar_store():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    con = sqlite3.connect(BAR_DB, timeout=30)
+    cols = ", ".join(f'"{c}" REAL' for c in BAR_COLUMNS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS bars (ticker TEXT NOT NULL, date TEXT NOT NULL, {cols}, PRIMARY KEY (ticker, date))")
+    con.execute("CREATE TABLE IF NOT EXISTS indicator_state (ticker TEXT PRIMARY KEY, date TEXT, state TEXT)")
+    return con
+
+def _clean_history(df):
+    if df.index.tz is not None: df.index = df.index.tz_localize(None)
+    df.columns = [str(c).lower() for c in df.columns]
+    df.index.name = 'date'
+    return df
+
+def load_bars(ticker):
+    """讀取本地 K 棒庫 (已清理、無時區、小寫欄位)"""
+    con = _connect_bar_store()
+    try:
+        cols = ", ".join(f'"{c}"' for c in BAR_COLUMNS)
+        df = pd.read_sql_query(f"SELECT date, {cols} FROM bars WHERE ticker = ? ORDER BY date", con, params=(ticker,), index_col='date', parse_dates=['date'])
+    finally:
+        con.close()
+    return df.astype(float)
+
+def save_bars(ticker, df):
+    """寫入 K 棒，同日期者覆蓋 (最後一根可能是盤中資料)"""
+    if df.empty: return
+    rows = df.reindex(columns=BAR_COLUMNS).astype(float)
+    records = [(ticker, d.strftime('%Y-%m-%d'), *[None if pd.isna(v) else float(v) for v in vals])
+               for d, vals in zip(rows.index, rows.itertuples(index=False))]
+    placeholders = ", ".join(["?"] * (len(BAR_COLUMNS) + 2))
+    con = _connect_bar_store()
+    try:
+        with con: con.executemany(f"INSERT OR REPLACE INTO bars VALUES ({placeholders})", records)
+    finally:
+        con.close()
+
+def delete_bars(ticker):
+    con = _connect_bar_store()
+    try:
+        with con:
+            con.execute("DELETE FROM bars WHERE ticker = ?", (ticker,))
+            con.execute("DELETE FROM indicator_state WHERE ticker = ?", (ticker,))
+    finally:
+        con.close()
+
+def load_indicator_state(ticker):
+    con = _connect_bar_store()
+    try:
+        row = con.execute("SELECT state FROM indicator_state WHERE ticker = ?", (ticker,)).fetchone()
+    finally:
+        con.close()
+    state = json.loads(row[0]) if row else None
+    return IndicatorEngine.from_dict(state) if state and state.get('version') == IndicatorEngine.VERSION else None
+
+def save_indicator_state(ticker, engine):
+    con = _connect_bar_store()
+    try:
+        with con: con.execute("INSERT OR REPLACE INTO indicator_state VALUES (?, ?, ?)",
+                              (ticker, engine.last_date, json.dumps(engine.to_dict())))
+    finally:
+        con.close()
+
+def update_bars(ticker, period="500d"):
+    """增量更新：只抓本地最後一根之後的 K 棒並附加；本地無資料時才抓完整歷史"""
+    import yfinance as yf
+    stored = load_bars(ticker)
+    stock = yf.Ticker(ticker)
+    try:
+        if stored.empty:
+            new_df = UPSTREAM.call("yahoo", stock.history, period=period, auto_adjust=False)
+        else:
+            new_df = UPSTREAM.call("yahoo", stock.history, start=stored.index[-1].strftime('%Y-%m-%d'), auto_adjust=False)
+    except UpstreamError:
+        # 上游掛了：本地有舊 K 棒就先用舊的
+        if stored.empty: raise
+        return stored
+    if new_df.empty: return stored
+    new_df = _clean_history(new_df).reindex(columns=BAR_COLUMNS)
+    # 新資料含庫裡還沒記錄的分割 => 歷史價格已被還原，舊庫存作廢重抓
+    # (重疊的最後一根若已存過同一筆分割，表示已重抓過，不再重複)
+    splits = new_df['stock splits'].fillna(0)
+    known = stored['stock splits'].reindex(new_df.index).fillna(0)
+    if not stored.empty and ((splits != 0) & (splits != known)).any():
+        new_df = _clean_history(UPSTREAM.call("yahoo", stock.history, period=period, auto_adjust=False)).reindex(columns=BAR_COLUMNS)
+        stored = stored.iloc[0:0]
+        delete_bars(ticker)
+    save_bars(ticker, new_df)
+    full_df = pd.concat([stored[stored.index < new_df.index[0]], new_df.astype(float)])
+    # 指標狀態跟著 K 棒一起前進，只餵新的 K 棒；狀態缺漏時才從頭重建
+    engine = load_indicator_state(ticker) if not stored.empty else None
+    if engine is None or engine.last_date < stored.index[-1].strftime('%Y-%m-%d'):
+        engine, new_rows = IndicatorEngine(), full_df
+    else:
+        new_rows = new_df[new_df.index.strftime('%Y-%m-%d') >= engine.last_date]
+    engine.run(new_rows)
+    save_indicator_state(ticker, engine)
+    return full_df
+
+def fetch_stock_data(stock_code):
+    """依主檔市場別找出有資料的代碼並增量更新 K 棒，回傳 (K 棒表, 完整代碼)"""
+    stock_code = str(stock_code).strip()
+    suffixes = candidate_suffixes(stock_code)
+    df = pd.DataFrame()
+    found_ticker = ""
+    upstream_error = None
+    for suffix in suffixes:
+        ticker = f"{stock_code}{suffix}"
+        try:
+            with METRICS.timed("suffix_probe" if len(suffixes) > 1 else "update_bars"): temp_df = update_bars(ticker)
+        except UpstreamError as e:
+            upstream_error = e
+            continue
+        if not temp_df.empty:
+            df = temp_df
+            found_ticker = ticker
+            break
+    # 查無資料才回空表；上游失敗要讓呼叫端知道 (也避免把失敗結果快取起來)
+    if df.empty and upstream_error is not None: raise upstream_error
+    if df.empty: return pd.DataFrame(), ""
+    return df, found_ticker
+
+
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+def load_bars_panel(tickers, chunk=500, fields=PANEL_FIELDS, start=None, by_bar=False):
+    """一次讀出多檔 K 棒，對齊成 {欄位: 日期 × 代碼} 的寬表；start (YYYY-MM-DD) 之前的日期不讀。
+
+    by_bar=True 時改以各檔自己的 K 棒序號對齊 (索引 ..., -1, 0，0 為每檔各自的最後一根)，
+    另附 'date' 欄位記每格的日期：某檔沒有 K 棒的日子不佔列，滾動視窗與「最後一根」都只看該檔自己的資料，
+    結果與逐檔 calculate_indicators 相同。要放回日期軸用 panel_by_date。
+    """
+    frames = []
+    since = "" if start is None else " AND date >= ?"
+    con = _connect_bar_store()
+    try:
+        for i in range(0, len(tickers), chunk):
+            part = list(tickers[i:i + chunk])
+            marks = ", ".join(["?"] * len(part))
+            cols = ", ".join(f'"{c}"' for c in fields)
+            frames.append(pd.read_sql_query(f"SELECT ticker, date, {cols} FROM bars WHERE ticker IN ({marks}){since}",
+                                            con, params=part + ([] if start is None else [start]), parse_dates=['date']))
+    finally:
+        con.close()
+    if not frames or all(f.empty for f in frames): return {}
+    long_df = pd.concat(frames, ignore_index=True)
+    if not by_bar:
+        return {f: long_df.pivot(index='date', columns='ticker', values=f).sort_index().astype(float) for f in fields}
+    long_df = long_df.sort_values(['ticker', 'date'], ignore_index=True)
+    long_df['bar'] = -long_df.groupby('ticker').cumcount(ascending=False)
+    panel = {f: long_df.pivot(index='bar', columns='ticker', values=f).sort_index().astype(float) for f in fields}
+    panel['date'] = long_df.pivot(index='bar', columns='ticker', values='date').sort_index()
+    return panel
+
+def panel_by_date(panel, dates):
+    """把 by_bar 對齊的寬表 (dates 為對應的 'date' 欄位) 放回 (日期 × 代碼)；某檔沒有 K 棒的日子為 NaN (布林欄位為 False)"""
+    d = dates.to_numpy()
+    valid = ~pd.isna(d)
+    index = pd.DatetimeIndex(np.unique(d[valid]), name='date')
+    rows, cols = index.get_indexer(d[valid]), np.nonzero(valid)[1]
+    out = {}
+    for name, frame in panel.items():
+        is_bool = (frame.dtypes == bool).all()
+        values = np.zeros((len(index), frame.shape[1]), dtype=bool) if is_bool else np.full((len(index), frame.shape[1]), np.nan)
+        values[rows, cols] = frame.to_numpy(dtype=bool if is_bool else np.float64)[valid]
+        out[name] = pd.DataFrame(values, index=index, columns=frame.columns)
+    return out
@@ -0,0 +1,116 @@
+"""批次分析：多檔並行算好指標、評分與建議並寫檔，儀表板有現成結果時直接讀取"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+
+from .backtest import LONG_ACTIONS, SHORT_ACTIONS, strategy_signals
+from .bars import fetch_stock_data, load_indicator_state
+from .config import RESULTS_DIR
+from .engine import extend_indicators
+from .indicators import calculate_indicators
+from .strategy import generate_dual_strategy
+from .symbols import get_stock_name
+from .upstream import UPSTREAM, UpstreamError
+
+FORMATS = ("parquet", "csv")
+# 逐日歷史中附在指標後面的策略欄位 (strategy_signals 的鍵)
+SIGNAL_FIELDS = ["score", "short_action", "stop_loss_short", "take_profit_short",
+                 "long_action", "stop_loss_long", "take_profit_long"]
+
+def _indicator_path(results_dir, stock_code, fmt):
+    return os.path.join(results_dir, "indicators", f"{stock_code}.{fmt}")
+
+def _newest(path_for):
+    """path_for(fmt) 在各格式中最近寫入的那個檔 (fmt, path)；換過 --format 時舊格式的檔還在，不能依 FORMATS 順序取"""
+    paths = {fmt: path_for(fmt) for fmt in FORMATS}
+    found = [(os.path.getmtime(path), fmt, path) for fmt, path in paths.items() if os.path.exists(path)]
+    return max(found)[1:] if found else (None, None)
+
+def _write(df, path):
+    if path.endswith(".parquet"): df.to_parquet(path)
+    else: df.to_csv(path)
+
+def _init_worker(workers):
+    """每個行程各有一份限流桶，按行程數平分，整體仍守住上游的速率上限"""
+    for bucket in UPSTREAM.buckets.values():
+        bucket.rate /= workers
+        bucket.capacity = max(1, bucket.capacity // workers)
+        bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+def analyze_ticker(stock_code, results_dir=RESULTS_DIR, fmt="parquet"):
+    """抓取 (增量) 一檔並寫出逐日指標 + 策略欄位，回傳最後一根的摘要列"""
+    row = {"代碼": stock_code, "名稱": get_stock_name(stock_code)}
+    try: df, ticker = fetch_stock_data(stock_code)
+    except UpstreamError: return {**row, "狀態": "抓取失敗"}
+    if df.empty: return {**row, "狀態": "查無資料"}
+
+    ind = load_indicators(stock_code, ticker, df, results_dir=results_dir)
+    sig = strategy_signals(ind)
+    history = ind.assign(**{k: sig[k]["value"] for k in SIGNAL_FIELDS})
+    history["short_action"] = history["short_action"].map(dict(enumerate(SHORT_ACTIONS)))
+    history["long_action"] = history["long_action"].map(dict(enumerate(LONG_ACTIONS)))
+    _write(history, _indicator_path(results_dir, stock_code, fmt))
+
+    last = ind.iloc[-1]
+    row.update({"狀態": "完成", "市場代碼": ticker, "日期": ind.index[-1], "收盤": last["close"]})
+    short_term, long_term = generate_dual_strategy(ind)
+    if short_term and long_term:
+        row.update({"分數": short_term["score"], "量能": short_term["vol"],
+                    "短線": short_term["title"], "短線建議": short_term["action"],
+                    "短線停損": float(short_term["stop_loss"]), "短線停利": float(short_term["take_profit"]),
+                    "長線": long_term["title"], "長線建議": long_term["action"],
+                    "長線防守": float(long_term["stop_loss"]), "長線目標": float(long_term["take_profit"])})
+    return row
+
+def run_batch(codes, results_dir=RESULTS_DIR, fmt="parquet", workers=None, progress=None):
+    """以行程池並行分析 codes；逐檔結果寫在 results_dir/indicators/，摘要寫成 results_dir/summary"""
+    if fmt not in FORMATS: raise ValueError(f"fmt must be one of {FORMATS}")
+    os.makedirs(os.path.join(results_dir, "indicators"), exist_ok=True)
+    codes = list(dict.fromkeys(str(c).strip() for c in codes))
+    workers = workers or min(4, os.cpu_count() or 1)
+    rows = []
+    if workers == 1:
+        results = map(analyze_ticker, codes, repeat(results_dir), repeat(fmt))
+        for i, row in enumerate(results):
+            rows.append(row)
+            if progress: progress(i + 1, len(codes))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+            results = pool.map(analyze_ticker, codes, repeat(results_dir), repeat(fmt), chunksize=8)
+            for i, row in enumerate(results):
+                rows.append(row)
+                if progress: progress(i + 1, len(codes))
+    summary = pd.DataFrame(rows).set_index("代碼")
+    _write(summary, os.path.join(results_dir, f"summary.{fmt}"))
+    return summary
+
+def load_precomputed(stock_code, last_date=None, last_close=None, results_dir=RESULTS_DIR):
+    """讀取批次算好的逐日指標；檔案不存在，或最後一根與目前 K 棒 (日期 / 收盤) 不符時回傳 None"""
+    fmt, path = _newest(lambda fmt: _indicator_path(results_dir, stock_code, fmt))
+    if path is None: return None
+    if fmt == "parquet": df = pd.read_parquet(path)
+    else: df = pd.read_csv(path, index_col="date", parse_dates=["date"])
+    if df.empty: return None
+    if last_date is not None and df.index[-1] != pd.Timestamp(last_date): return None
+    if last_close is not None and df["close"].iloc[-1] != last_close: return None
+    return df
+
+def load_indicators(stock_code, ticker, bars, columns=None, history=None, results_dir=RESULTS_DIR):
+    """bars 的逐日指標，盡量不整段重算：批次算好的歷史 (history，省略時讀檔) 與 bars 一致就直接用；
+    只差最後一根 (盤中、或前一晚批次之後又多一根) 時接上 K 棒庫引擎記著的那一根；都不行才以 columns 整段計算"""
+    if history is None: history = load_precomputed(stock_code, results_dir=results_dir)
+    if history is not None:
+        history = history.drop(columns=SIGNAL_FIELDS, errors="ignore")
+        if history.index[-1] == bars.index[-1] and history["close"].iloc[-1] == bars["close"].iloc[-1]: return history
+        extended = extend_indicators(history, bars, load_indicator_state(ticker))
+        if extended is not None: return extended
+    return calculate_indicators(bars, columns)
+
+def load_summary(results_dir=RESULTS_DIR):
+    """最近一次批次的摘要表 (每檔一列)；尚未跑過批次時回傳空表"""
+    fmt, path = _newest(lambda fmt: os.path.join(results_dir, f"summary.{fmt}"))
+    if path is None: return pd.DataFrame()
+    if fmt == "parquet": return pd.read_parquet(path)
+    return pd.read_csv(path, index_col="代碼", dtype={"代碼": str}, parse_dates=["日期"])
@@ -0,0 +1,251 @@
+"""結果快取：可抽換的後端 (行程內 LRU / 本機 SQLite / Redis)，容量以位元組計，TTL 依台股交易時段調整
+
+STOCK_CACHE 選擇後端：memory (預設，只在本行程)、sqlite (同機多個 worker 共用 <資料目錄>/cache.sqlite)、
+redis://主機:埠/庫 (跨機器共用，需安裝 redis 套件)；STOCK_CACHE_MB 為容量上限 (預設 256)。
+"""
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, time as dtime, timedelta, timezone
+
+from .config import DATA_DIR
+from .metrics import METRICS
+
+CACHE_URL = os.environ.get("STOCK_CACHE", "memory")
+CACHE_MAX_BYTES = int(float(os.environ.get("STOCK_CACHE_MB", "256")) * 2 ** 20)
+
+# 台股交易時段 (台北時間，無日光節約)；收盤後報價源仍會補上延遲報價與盤後定價，再等一段才視為定案
+TAIPEI = timezone(timedelta(hours=8))
+MARKET_OPEN, MARKET_CLOSE = dtime(9, 0), dtime(13, 30)
+CLOSE_SETTLE = timedelta(minutes=30)
+
+def _next_open(now):
+    day = now.date() if now.time() < MARKET_OPEN else now.date() + timedelta(days=1)
+    while day.weekday() >= 5: day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=TAIPEI)
+
+def is_market_open(now=None):
+    """是否在盤中 (含收盤後的定案緩衝)，這段時間報價還會變動"""
+    now = (now or datetime.now(TAIPEI)).astimezone(TAIPEI)
+    settled = (datetime.combine(now.date(), MARKET_CLOSE, tzinfo=TAIPEI) + CLOSE_SETTLE).time()
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < settled
+
+def market_ttl(session_ttl, now=None):
+    """盤中回傳 session_ttl 秒；其餘時間資料不會再變，快取到下一次開盤"""
+    now = (now or datetime.now(TAIPEI)).astimezone(TAIPEI)
+    if is_market_open(now): return session_ttl
+    return (_next_open(now) - now).total_seconds()
+
+def _count_evictions(keys):
+    """被淘汰的 key 依前綴的函式名 (@cached 的 name) 記到各函式的 evictions；後端的 stats() 另記全體總數"""
+    for name, n in Counter(key.split(":", 1)[0] for key in keys).items(): METRICS.count(name, "evictions", n)
+
+class MemoryBackend:
+    """行程內 LRU：以序列化後的位元組數計容量，過期項目在讀取時丟棄"""
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> (到期時間, 位元組)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None: return None
+            if item[0] <= time.time():
+                self._drop(key)
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, blob, ttl):
+        if len(blob) > self.max_bytes: return
+        evicted = []
+        with self._lock:
+            if key in self._items: self._drop(key)
+            self._items[key] = (time.time() + ttl, blob)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                evicted.append(next(iter(self._items)))
+                self._drop(evicted[-1])
+            self.evictions += len(evicted)
+        _count_evictions(evicted)
+
+    def _drop(self, key):
+        self._bytes -= len(self._items.pop(key)[1])
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [k for k in self._items if k.startswith(prefix)]: self._drop(key)
+
+    def stats(self):
+        return {"entries": len(self._items), "bytes": self._bytes, "evictions": self.evictions}
+
+class SQLiteBackend:
+    """同一台機器上多個行程共用的快取檔；超過容量時刪除最久未讀的項目"""
+    def __init__(self, path=os.path.join(DATA_DIR, "cache.sqlite"), max_bytes=CACHE_MAX_BYTES):
+        self.path, self.max_bytes = path, max_bytes
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL, size INTEGER)")
+            con.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        finally:
+            con.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        con = self._connect()
+        try:
+            now = time.time()
+            row = con.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None: return None
+            with con:
+                if row[1] <= now:
+                    con.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    return None
+                con.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+        finally:
+            con.close()
+
+    def set(self, key, blob, ttl):
+        if len(blob) > self.max_bytes: return
+        con = self._connect()
+        try:
+            now = time.time()
+            with con:
+                con.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", (key, blob, now + ttl, now, len(blob)))
+                con.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                total = con.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                if total > self.max_bytes:
+                    # 由最久未讀者往後累加，刪到總量回到上限以內
+                    doomed = []
+                    for k, size in con.execute("SELECT key, size FROM cache WHERE key != ? ORDER BY accessed", (key,)):
+                        if total <= self.max_bytes: break
+                        doomed.append((k,))
+                        total -= size
+                    con.executemany("DELETE FROM cache WHERE key = ?", doomed)
+                    self.evictions += len(doomed)
+                    _count_evictions(k for (k,) in doomed)
+        finally:
+            con.close()
+
+    def clear(self, prefix=""):
+        con = self._connect()
+        try:
+            with con: con.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        finally:
+            con.close()
+
+    def stats(self):
+        con = self._connect()
+        try:
+            entries, size = con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        finally:
+            con.close()
+        return {"entries": entries, "bytes": size, "evictions": self.evictions}
+
+class RedisBackend:
+    """跨機器共用；client 為 redis.Redis 相容物件 (測試可換成本地替身)。
+    容量與淘汰交給伺服器端設定 (maxmemory + allkeys-lru)，這裡只負責 TTL；伺服器端的淘汰看不到，各函式的 evictions 不會增加。"""
+    def __init__(self, client, namespace="stock:"):
+        self.client, self.namespace = client, namespace
+
+    def get(self, key):
+        return self.client.get(self.namespace + key)
+
+    def set(self, key, blob, ttl):
+        self.client.set(self.namespace + key, blob, ex=max(1, int(ttl)))
+
+    def clear(self, prefix=""):
+        keys = list(self.client.scan_iter(match=f"{self.namespace}{prefix}*"))
+        if keys: self.client.delete(*keys)
+
+    def stats(self):
+        return {"keys": self.client.dbsize()}  # 整個庫的鍵數 (O(1))；逐一掃描命名空間太貴
+
+def backend_from_url(url=CACHE_URL, max_bytes=CACHE_MAX_BYTES):
+    if url == "memory": return MemoryBackend(max_bytes)
+    if url == "sqlite": return SQLiteBackend(max_bytes=max_bytes)
+    if url.startswith("sqlite:///"): return SQLiteBackend(url[len("sqlite:///"):], max_bytes)
+    if url.startswith(("redis://", "rediss://")):
+        import redis
+        return RedisBackend(redis.Redis.from_url(url))
+    raise ValueError(f"unknown cache backend: {url}")
+
+BACKEND = backend_from_url()
+METRICS.register("cache_backend", lambda: BACKEND.stats())
+
+def set_backend(backend):
+    """換掉全域後端 (例如測試時注入替身)；已加上 @cached 的函式會立即改用新後端"""
+    global BACKEND
+    BACKEND = backend
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.error = None
+
+class SingleFlight:
+    """同一個 key 同時只讓一個呼叫者真的執行，其餘等它做完共用結果 (或同一個例外)"""
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """回傳 (結果, 是否為共用別人的結果)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader: flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None: raise flight.error
+            return flight.result, True
+        try: flight.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock: del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+_FLIGHTS = SingleFlight()
+
+def cached(name, ttl, stage=None):
+    """結果快取裝飾器；ttl 為秒數或回傳秒數的函式 (例如 market_ttl)。
+    只快取正常回傳值，例外照常往上丟；未命中時的計算耗時記在 stage (預設為 name)。
+    同一行程內同時未命中同一個 key 時只算一次，其餘呼叫記為 coalesced。"""
+    def decorate(fn):
+        def compute(key, args, kwargs):
+            with METRICS.timed(stage or name): result = fn(*args, **kwargs)
+            blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            BACKEND.set(key, blob, ttl() if callable(ttl) else ttl)
+            return blob
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            key = f"{name}:" + hashlib.sha1(pickle.dumps((args, sorted(kwargs.items())))).hexdigest()
+            blob = BACKEND.get(key)
+            if blob is not None:
+                METRICS.count(name, "hits")
+                return pickle.loads(blob)
+            # 每個呼叫者各自還原一份，與命中時一樣不會共用同一個可變物件
+            blob, shared = _FLIGHTS.do(key, compute, key, args, kwargs)
+            METRICS.count(name, "coalesced" if shared else "misses")
+            return pickle.loads(blob)
+        call.clear = lambda: BACKEND.clear(f"{name}:")
+        return call
+    return decorate
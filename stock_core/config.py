@@ -0,0 +1,5 @@
+"""本地資料位置；STOCK_DATA_DIR 可把 K 棒庫、主檔與批次結果指到別處 (例如效能測試用的暫存目錄)"""
+import os
+
+DATA_DIR = os.environ.get("STOCK_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+RESULTS_DIR = os.path.join(DATA_DIR, "results")
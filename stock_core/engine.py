@@ -0,0 +1,165 @@
+"""增量指標引擎 (每根 K 棒 O(1) 更新，狀態可保存)"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+class _Ewm:
+    """與 pandas ewm().mean() 相同的遞迴 (含 NaN 與 adjust 行為)，逐筆更新"""
+    def __init__(self, com, adjust, weighted=np.nan, old_wt=1.0, nobs=0):
+        self.com, self.adjust = com, adjust
+        self.weighted, self.old_wt, self.nobs = weighted, old_wt, nobs
+
+    def update(self, cur):
+        cur = np.float64(cur)
+        alpha = 1. / (1. + self.com)
+        new_wt = 1. if self.adjust else alpha
+        is_obs = cur == cur
+        self.nobs += int(is_obs)
+        if self.weighted == self.weighted:
+            self.old_wt *= 1. - alpha
+            if is_obs:
+                if self.weighted != cur:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * cur) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.
+        elif is_obs:
+            self.weighted = cur
+        return self.weighted if self.nobs >= 1 else np.nan
+
+    def to_dict(self):
+        return {'com': self.com, 'adjust': self.adjust, 'weighted': float(self.weighted),
+                'old_wt': float(self.old_wt), 'nobs': int(self.nobs)}
+
+class IndicatorEngine:
+    """calculate_indicators 的逐根版本：EMA 累加器 + 環形緩衝，新增一根 K 棒只做常數次運算"""
+    MA_WINDOWS = {'MA5': 5, 'MA10': 10, 'MA20': 20, 'MA60': 60}
+    EWM_SPECS = {'K': (2, True), 'D': (2, True), 'EXP12': (5.5, False), 'EXP26': (12.5, False),
+                 'Signal': (4, False), 'ATR': (6.5, False), '+DM_EMA': (6.5, False), '-DM_EMA': (6.5, False),
+                 'ADX': (6.5, False)}
+    # 狀態格式版本：欄位或緩衝有變動時加一，舊版狀態視為不存在 (由 K 棒重建)
+    VERSION = 2
+    BUFFERS = {'close': 60, 'high': 9, 'low': 9, 'volume': 5, 'gain': 14, 'loss': 14, 'high120': 120}
+
+    def __init__(self):
+        self.last_date = None
+        self.prev = {'close': np.nan, 'high': np.nan, 'low': np.nan, 'volume': np.nan, 'volume2': np.nan}
+        self.obv = 0.0
+        self.bufs = {k: deque(maxlen=n) for k, n in self.BUFFERS.items()}
+        self.ewms = {k: _Ewm(com, adjust) for k, (com, adjust) in self.EWM_SPECS.items()}
+        self._checkpoint = None
+        self.latest = None  # 最後一根的全部指標 (含收盤)，供 extend_indicators 直接取用
+
+    @staticmethod
+    def _mean(buf, n):
+        return sum(list(buf)[-n:]) / n if len(buf) >= n else np.nan
+
+    def update(self, date, high, low, close, volume, checkpoint=True):
+        """餵入一根 K 棒，回傳該根的所有指標；同一日期重複餵入 (盤中更新) 會先還原到前一根的狀態"""
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        if date == self.last_date and self._checkpoint is not None:
+            self.__dict__.update(IndicatorEngine.from_dict(self._checkpoint).__dict__)
+        self._checkpoint = self.to_dict(with_checkpoint=False) if checkpoint else None
+        high, low, close, volume = (np.float64(x) for x in (high, low, close, volume))
+        prev = self.prev
+        b = self.bufs
+        out = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            b['close'].append(close); b['high'].append(high); b['low'].append(low); b['volume'].append(volume)
+            b['high120'].append(high)
+            for col, n in self.MA_WINDOWS.items(): out[col] = self._mean(b['close'], n)
+            out['VolMA5'] = self._mean(b['volume'], 5)
+            # rolling(120, min_periods=1).max()：略過 NaN，全為 NaN 時為 NaN
+            highs = [h for h in b['high120'] if h == h]
+            out['High120'] = max(highs) if highs else np.nan
+
+            # rolling(9).max() / min() 視窗內有 NaN 即為 NaN (內建 max / min 遇到 NaN 的結果取決於順序，不能直接用)
+            window_ok = len(b['high']) == 9 and all(h == h for h in b['high']) and all(l == l for l in b['low'])
+            rsv_den = max(b['high']) - min(b['low']) if window_ok else np.nan
+            if rsv_den == 0: rsv_den = np.float64(1)
+            out['RSV'] = (close - min(b['low'])) / rsv_den * 100 if window_ok else np.nan
+            out['K'] = self.ewms['K'].update(out['RSV'])
+            out['D'] = self.ewms['D'].update(out['K'])
+            out['MACD'] = self.ewms['EXP12'].update(close) - self.ewms['EXP26'].update(close)
+            out['Signal'] = self.ewms['Signal'].update(out['MACD'])
+            out['Hist'] = out['MACD'] - out['Signal']
+            delta = close - prev['close']
+            b['gain'].append(delta if delta > 0 else 0.0)
+            b['loss'].append(-delta if delta < 0 else 0.0)
+            rs = np.float64(self._mean(b['gain'], 14)) / self._mean(b['loss'], 14)
+            out['RSI'] = 100 - (100 / (1 + rs))
+            out['BB_Mid'] = out['MA20']
+            window = list(b['close'])[-20:]
+            out['BB_Std'] = np.std(window, ddof=1) if len(window) == 20 else np.nan
+            out['BB_Up'] = out['BB_Mid'] + 2 * out['BB_Std']
+            out['BB_Low'] = out['BB_Mid'] - 2 * out['BB_Std']
+            out['BBW'] = (out['BB_Up'] - out['BB_Low']) / out['BB_Mid']
+
+            term = np.sign(delta) * volume  # (sign(差) × 量).fillna(0).cumsum()
+            if term == term: self.obv += term
+            out['OBV'] = self.obv
+
+            up_move, down_move = high - prev['high'], prev['low'] - low
+            plus_dm = up_move if (up_move > down_move) and (up_move > 0) else 0.0
+            minus_dm = down_move if (down_move > up_move) and (down_move > 0) else 0.0
+            hl, hc, lc = high - low, abs(high - prev['close']), abs(low - prev['close'])
+            tr = hl if hl > lc else lc
+            if not hl > hc: tr = hc
+            if tr != tr: tr = np.float64(0)
+            out['TR'] = tr
+            out['ATR'] = self.ewms['ATR'].update(tr)
+            out['+DI'] = (self.ewms['+DM_EMA'].update(plus_dm) / out['ATR']) * 100
+            out['-DI'] = (self.ewms['-DM_EMA'].update(minus_dm) / out['ATR']) * 100
+            out['DX'] = (abs(out['+DI'] - out['-DI']) / (out['+DI'] + out['-DI'])) * 100
+            out['ADX'] = self.ewms['ADX'].update(out['DX'])
+
+            out['Vol_Inc'] = bool((volume > prev['volume']) & (prev['volume'] > prev['volume2']))
+            out['Vol_Dec'] = bool((volume < prev['volume']) & (prev['volume'] < prev['volume2']))
+
+        self.prev = {'close': close, 'high': high, 'low': low, 'volume': volume, 'volume2': prev['volume']}
+        self.last_date = date
+        self.latest = {'close': close, **out}
+        return out
+
+    def run(self, df):
+        """依序餵入 df 的每一根 K 棒 (可用來建立初始狀態)，回傳逐根指標表"""
+        n = len(df)
+        rows = [self.update(d, h, l, c, v, checkpoint=(i == n - 1)) for i, (d, h, l, c, v) in
+                enumerate(zip(df.index, df['high'], df['low'], df['close'], df['volume']))]
+        return pd.DataFrame(rows, index=df.index)
+
+    def to_dict(self, with_checkpoint=True):
+        state = {'version': self.VERSION, 'last_date': self.last_date, 'obv': float(self.obv),
+                 'prev': {k: float(v) for k, v in self.prev.items()},
+                 'bufs': {k: [float(x) for x in v] for k, v in self.bufs.items()},
+                 'ewms': {k: e.to_dict() for k, e in self.ewms.items()},
+                 'latest': None if self.latest is None else {k: v if isinstance(v, bool) else float(v) for k, v in self.latest.items()}}
+        if with_checkpoint: state['checkpoint'] = self._checkpoint
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        engine = cls()
+        engine.last_date, engine.obv = state['last_date'], np.float64(state['obv'])
+        engine.prev = {k: np.float64(v) for k, v in state['prev'].items()}
+        for k, values in state['bufs'].items():
+            if k in engine.bufs: engine.bufs[k].extend(np.float64(x) for x in values)
+        engine.ewms = {k: _Ewm(**{**e, 'weighted': np.float64(e['weighted']), 'old_wt': np.float64(e['old_wt'])})
+                       for k, e in state['ewms'].items()}
+        engine._checkpoint = state.get('checkpoint')
+        latest = state.get('latest')
+        engine.latest = None if latest is None else {k: v if isinstance(v, bool) else np.float64(v) for k, v in latest.items()}
+        return engine
+
+def extend_indicators(ind, bars, engine):
+    """以 engine 記著的最後一根接上逐日指標，不重算整段：ind 須涵蓋到 bars 的倒數第二根 (可多含一根舊版的最後一根，
+    例如盤中更新前的 K 棒)，engine 須停在 bars 的最後一根 (日期與收盤相同)。條件不符時回傳 None，由呼叫端整段重算"""
+    if engine is None or engine.latest is None or ind is None or len(bars) < 2: return None
+    last = bars.index[-1]
+    if engine.last_date != last.strftime('%Y-%m-%d') or engine.latest['close'] != bars['close'].iloc[-1]: return None
+    prior = ind[ind.index < last]
+    if prior.empty or prior.index[-1] != bars.index[-2] or prior['close'].iloc[-1] != bars['close'].iloc[-2]: return None
+    if any(c not in bars.columns and c not in engine.latest for c in ind.columns): return None
+    bar = bars.iloc[-1]
+    row = {c: bar[c] if c in bars.columns else engine.latest[c] for c in ind.columns}
+    return pd.concat([prior, pd.DataFrame([row], index=bars.index[-1:])])
+
@@ -0,0 +1,70 @@
+"""滑動視窗最高 / 最低：單調佇列，任何窗長都只把整段歷史走一次 (O(n))
+
+RSV 的 9 日高低、長線目標的 120 日高點、黃金分割的 20/60/240 日通道都由這裡算；
+WindowExtrema 依 (方向, 窗長) 記住算過的結果，同一份 K 棒不會為了同一個窗長重掃。
+結果 (含 NaN 與 min_periods 的規則) 與 pandas rolling(window, min_periods).max() / .min() 相同。
+有 numba 時 JIT 編譯，否則 (或 STOCK_KERNEL=pandas) 直接用 pandas rolling。
+"""
+import numpy as np
+import pandas as pd
+
+from . import kernel
+
+def _rolling_extreme(x, window, min_periods, is_max, out):
+    """x、out 為 (列 × 檔) 陣列；佇列只存索引，由舊到新對應的值單調遞減 (取最高) 或遞增 (取最低)"""
+    n_rows, n_cols = x.shape
+    queue = np.empty(n_rows, dtype=np.int64)
+    for j in range(n_cols):
+        head = tail = count = 0
+        for i in range(n_rows):
+            v = x[i, j]
+            if v == v:
+                count += 1
+                while tail > head and ((x[queue[tail - 1], j] <= v) if is_max else (x[queue[tail - 1], j] >= v)):
+                    tail -= 1
+                queue[tail] = i
+                tail += 1
+            if i >= window:
+                old = x[i - window, j]
+                if old == old: count -= 1
+                while tail > head and queue[head] <= i - window: head += 1
+            out[i, j] = x[queue[head], j] if tail > head and count >= min_periods else np.nan
+
+_KERNEL = None
+
+def _compiled_kernel():
+    global _KERNEL
+    if _KERNEL is None:
+        from numba import njit
+        _KERNEL = njit(cache=True)(_rolling_extreme)
+    return _KERNEL
+
+def rolling_extreme(x, window, min_periods=None, is_max=True):
+    """x 為單檔 Series 或 (日期 × 代碼) 寬表；等同 x.rolling(window, min_periods).max() (is_max=False 時為 min)"""
+    min_periods = window if min_periods is None else min_periods
+    if not kernel.AVAILABLE:
+        rolling = x.rolling(window, min_periods=min_periods)
+        return rolling.max() if is_max else rolling.min()
+    values = kernel._as_2d(x)
+    out = np.empty(values.shape, order='F')
+    _compiled_kernel()(values, window, min_periods, is_max, out)
+    if isinstance(x, pd.DataFrame): return pd.DataFrame(out, index=x.index, columns=x.columns, copy=False)
+    return pd.Series(out[:, 0], index=x.index, name=x.name, copy=False)
+
+class WindowExtrema:
+    """一組 high / low 的滑動最高 (取 high) 與最低 (取 low)，依窗長記憶；回傳的物件為共用，不要就地修改"""
+    def __init__(self, high, low):
+        self.high, self.low = high, low
+        self._memo = {}
+
+    def _get(self, is_max, window, min_periods):
+        key = (is_max, window, window if min_periods is None else min_periods)
+        if key not in self._memo:
+            self._memo[key] = rolling_extreme(self.high if is_max else self.low, window, key[2], is_max)
+        return self._memo[key]
+
+    def max(self, window, min_periods=None):
+        return self._get(True, window, min_periods)
+
+    def min(self, window, min_periods=None):
+        return self._get(False, window, min_periods)
@@ -0,0 +1,76 @@
+"""盤中報價輪詢：不論多少個畫面在看同一檔，每個間隔只向上游抓一次"""
+import threading
+import time
+
+from .bars import fetch_stock_data
+from .cache import is_market_open
+from .metrics import METRICS
+from .upstream import UpstreamError
+
+QUOTE_INTERVAL = 30  # 秒
+
+class QuoteFeed:
+    """背景執行緒輪詢「有人在看」的代碼，最新 K 棒放在記憶體給各個畫面讀取。
+    畫面每次讀取前呼叫 watch() 表示仍在看；超過 idle_after 秒沒出現的觀看者會被移除，
+    沒有任何觀看者時執行緒自行結束，下一次 watch() 再啟動。上游負載只跟「不同代碼數」成正比。"""
+    def __init__(self, fetch=fetch_stock_data, interval=QUOTE_INTERVAL, idle_after=None):
+        self.fetch, self.interval = fetch, interval
+        self.idle_after = idle_after or 3 * interval
+        self._viewers = {}  # 代碼 -> {觀看者: 最後出現時間}
+        self._latest = {}   # 代碼 -> (版本, K 棒表)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.polls = self.failures = 0
+
+    def watch(self, code, viewer):
+        with self._lock:
+            self._viewers.setdefault(code, {})[viewer] = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="quote-feed")
+                self._thread.start()
+
+    def latest(self, code):
+        """(版本, K 棒表)；尚未輪詢過回傳 (0, None)"""
+        with self._lock: return self._latest.get(code, (0, None))
+
+    def _watched(self):
+        """清掉閒置的觀看者並回傳仍有人看的代碼；完全沒人看時讓執行緒結束"""
+        cutoff = time.monotonic() - self.idle_after
+        with self._lock:
+            for code in list(self._viewers):
+                viewers = {v: seen for v, seen in self._viewers[code].items() if seen >= cutoff}
+                if viewers: self._viewers[code] = viewers
+                else:
+                    del self._viewers[code]
+                    self._latest.pop(code, None)
+            if not self._viewers: self._thread = None
+            return list(self._viewers)
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            codes = self._watched()
+            if not codes: return
+            if is_market_open():
+                for code in codes: self.poll(code)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def poll(self, code):
+        self.polls += 1
+        try:
+            with METRICS.timed("quote_poll"): df, _ = self.fetch(code)
+        except UpstreamError:
+            self.failures += 1
+            return
+        if df.empty: return
+        with self._lock:
+            version = self._latest.get(code, (0, None))[0]
+            self._latest[code] = (version + 1, df)
+
+    def stats(self):
+        with self._lock:
+            return {"watched": len(self._viewers), "viewers": sum(len(v) for v in self._viewers.values()),
+                    "polls": self.polls, "failures": self.failures}
+
+FEED = QuoteFeed()
+METRICS.register("quote_feed", FEED.stats)
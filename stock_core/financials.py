@@ -0,0 +1,297 @@
+"""財務數據：本地基本面資料庫 (逐季財報) 與橫斷面查詢
+
+季報一季才變一次，不必每次看盤都向上游要；全市場批次匯入到 <資料目錄>/fundamentals.sqlite，
+每一季存成一列型別明確的欄位。本益比 / 股價淨值比 / 殖利率由季報加上本地 K 棒 (收盤、配息) 推算，
+不再呼叫 yfinance 最慢的 ticker.info。valuation 表是全市場的估值快照，「產業內本益比百分位」、
+「營收年增率前 50 名」之類的查詢直接讀它。
+
+    python -m stock_core fundamentals --universe
+"""
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .bars import BAR_DB, _connect_bar_store
+from .config import DATA_DIR
+from .metrics import METRICS
+from .symbols import candidate_suffixes, load_symbol_master
+from .upstream import UPSTREAM, UpstreamError
+
+FUND_DB = os.path.join(DATA_DIR, "fundamentals.sqlite")
+STALE_DAYS = 30  # 距上次匯入超過這麼多天才重抓 (季報約每 90 天一份)
+# 欄位 -> (報表, 依序嘗試的科目名稱)；eps 缺漏時以 淨利 / 股數 代替
+STATEMENT_FIELDS = {
+    "revenue": ("income", ["Total Revenue", "Operating Revenue"]),
+    "gross_profit": ("income", ["Gross Profit"]),
+    "operating_income": ("income", ["Operating Income"]),
+    "net_income": ("income", ["Net Income", "Net Income Common Stockholders"]),
+    "eps": ("income", ["Diluted EPS", "Basic EPS"]),
+    "equity": ("balance", ["Stockholders Equity", "Common Stock Equity"]),
+    "shares": ("balance", ["Ordinary Shares Number", "Share Issued"]),
+}
+STATEMENT_COLUMNS = list(STATEMENT_FIELDS)
+VALUATION_COLUMNS = ["industry", "date", "close", "eps_ttm", "pe", "pb", "dividend_yield",
+                     "period", "revenue", "revenue_yoy", "net_margin"]
+
+def _connect():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    con = sqlite3.connect(FUND_DB, timeout=30)
+    cols = ", ".join(f"{c} REAL" for c in STATEMENT_COLUMNS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS statements (code TEXT NOT NULL, period TEXT NOT NULL, {cols}, PRIMARY KEY (code, period))")
+    con.execute("CREATE TABLE IF NOT EXISTS ingest_log (code TEXT PRIMARY KEY, fetched TEXT, status TEXT)")
+    con.execute("""CREATE TABLE IF NOT EXISTS valuation (code TEXT PRIMARY KEY, industry TEXT, date TEXT, close REAL,
+                   eps_ttm REAL, pe REAL, pb REAL, dividend_yield REAL, period TEXT, revenue REAL, revenue_yoy REAL, net_margin REAL)""")
+    return con
+
+def _pick(statement, labels, fuzzy=None):
+    """依序找第一個存在的科目；都沒有時用 fuzzy 關鍵字比對 (與舊版抓營收 / 淨利的方式相同)"""
+    for label in labels:
+        if label in statement.columns: return statement[label]
+    if fuzzy:
+        matches = [c for c in statement.columns if any(word in str(c) for word in fuzzy)]
+        if matches: return statement[matches[0]]
+    return None
+
+def _ticker_for(stock_code):
+    """主檔沒登錄市場別的代碼，看本地 K 棒庫裡哪個市場別有資料 (抓價格時已探測過)"""
+    suffixes = candidate_suffixes(stock_code)
+    if len(suffixes) > 1:
+        con = _connect_bar_store()
+        try:
+            for suffix in suffixes:
+                if con.execute("SELECT 1 FROM bars WHERE ticker = ? LIMIT 1", (f"{stock_code}{suffix}",)).fetchone():
+                    return f"{stock_code}{suffix}"
+        finally:
+            con.close()
+    return f"{stock_code}{suffixes[0]}"
+
+def fetch_statements(stock_code, ticker=None):
+    """向上游抓一檔的季度損益表與資產負債表，整理成 (季末日 × STATEMENT_COLUMNS)；上游失敗丟出 UpstreamError。
+    ticker 為已知的完整代碼 (如價格抓取探測到的 .TWO)，省略時由主檔或本地 K 棒庫判斷"""
+    import yfinance as yf
+    ticker = yf.Ticker(ticker or _ticker_for(stock_code))
+    # 兩張報表是兩個獨立的慢請求，同時送出
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        income = pool.submit(UPSTREAM.call, "yahoo", lambda: ticker.quarterly_income_stmt, cache_key=("income", stock_code))
+        balance = pool.submit(UPSTREAM.call, "yahoo", lambda: ticker.quarterly_balance_sheet, cache_key=("balance", stock_code))
+    statements = {"income": income.result().T, "balance": balance.result().T}
+    fuzzy = {"revenue": ["Revenue", "Sales"], "net_income": ["Net Income"]}
+    columns = {}
+    for name, (kind, labels) in STATEMENT_FIELDS.items():
+        series = _pick(statements[kind], labels, fuzzy.get(name)) if not statements[kind].empty else None
+        if series is not None: columns[name] = pd.to_numeric(series, errors="coerce")
+    table = pd.DataFrame(columns, columns=STATEMENT_COLUMNS).astype(float)
+    if not table.empty:
+        table.index = pd.to_datetime(table.index).normalize()
+        table = table.groupby(level=0).first().sort_index().dropna(how="all")
+        table['eps'] = table['eps'].fillna(table['net_income'] / table['shares'])
+    table.index.name = "period"
+    return table
+
+def save_statements(stock_code, table):
+    """逐季寫入並記下匯入日與狀態，回傳狀態；同一季再匯入時只補上新值，上游這次缺的科目保留舊值。
+    空表：ETF 等本來就沒有季報的記 empty，不必一再重抓；主檔登錄為股票的應該要有，記 failed 下次再試"""
+    records = [(stock_code, d.strftime('%Y-%m-%d'), *[None if pd.isna(v) else float(v) for v in vals])
+               for d, vals in zip(table.index, table.reindex(columns=STATEMENT_COLUMNS).itertuples(index=False))]
+    updates = ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in STATEMENT_COLUMNS)
+    placeholders = ", ".join(["?"] * (len(STATEMENT_COLUMNS) + 2))
+    info = load_symbol_master().get(stock_code)
+    status = "ok" if records else "failed" if info is not None and info.type == "股票" else "empty"
+    con = _connect()
+    try:
+        with con:
+            con.executemany(f"INSERT INTO statements VALUES ({placeholders}) ON CONFLICT (code, period) DO UPDATE SET {updates}", records)
+            con.execute("INSERT OR REPLACE INTO ingest_log VALUES (?, ?, ?)", (stock_code, date.today().isoformat(), status))
+    finally:
+        con.close()
+    return status
+
+def load_statements(stock_code):
+    """本地庫中一檔的全部季度 (由舊到新)"""
+    con = _connect()
+    try:
+        df = pd.read_sql_query(f"SELECT period, {', '.join(STATEMENT_COLUMNS)} FROM statements WHERE code = ? ORDER BY period",
+                               con, params=(stock_code,), index_col="period", parse_dates=["period"])
+    finally:
+        con.close()
+    return df.astype(float)
+
+def _fetched(codes):
+    """{代碼: (上次匯入日期, 狀態)}"""
+    con = _connect()
+    try:
+        marks = ", ".join("?" * len(codes))
+        return {code: (fetched, status) for code, fetched, status in
+                con.execute(f"SELECT code, fetched, status FROM ingest_log WHERE code IN ({marks})", list(codes)).fetchall()}
+    finally:
+        con.close()
+
+def _is_stale(mark, max_age_days):
+    """從未匯入、上次失敗或匯入日超過 max_age_days 天"""
+    if mark is None or mark[1] == "failed": return True
+    return mark[0] < (date.today() - timedelta(days=max_age_days)).isoformat()
+
+def _ingest_one(stock_code):
+    try: return save_statements(stock_code, fetch_statements(stock_code))
+    except UpstreamError: return "failed"
+
+def ingest_fundamentals(codes, max_age_days=STALE_DAYS, workers=4, progress=None):
+    """批次匯入 codes 的季報 (略過 max_age_days 內匯入過的)，最後重算估值快照；回傳各狀態的檔數。
+    上游速率由 UPSTREAM 的限流桶控制，workers 只決定同時有幾個請求在等"""
+    codes = list(dict.fromkeys(str(c).strip() for c in codes))
+    marks = {}
+    for i in range(0, len(codes), 500): marks.update(_fetched(codes[i:i + 500]))
+    todo = [c for c in codes if _is_stale(marks.get(c), max_age_days)]
+    counts = {"ok": 0, "empty": 0, "failed": 0, "skipped": len(codes) - len(todo)}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, status in enumerate(pool.map(_ingest_one, todo)):
+            counts[status] += 1
+            if progress: progress(i + 1, len(todo))
+    refresh_valuation()
+    return counts
+
+def get_statements(stock_code, max_age_days=STALE_DAYS, ticker=None):
+    """讀本地季報；從未匯入或已過期時先向上游補抓 (上游失敗但本地有舊資料時用舊的)"""
+    stock_code = str(stock_code).strip()
+    if _is_stale(_fetched([stock_code]).get(stock_code), max_age_days):
+        try:
+            with METRICS.timed("fetch_statements"): save_statements(stock_code, fetch_statements(stock_code, ticker))
+        except UpstreamError:
+            stored = load_statements(stock_code)
+            if stored.empty: raise
+            return stored
+    return load_statements(stock_code)
+
+def _valuation_frame(statements, prices):
+    """statements 為 (code, period, 各科目) 的長表，依 code、period 排序；prices 為以 code 為索引的 close / dividends。
+    每檔一列：近四季 EPS、本益比、股價淨值比、殖利率、最新一季營收年增率與淨利率 (不足時為 NaN)"""
+    latest = statements.groupby("code", sort=False).tail(1).set_index("code")
+    # 近四季 EPS：最近四個有值的季度，且必須連續 (最早與最新的季末相差不到一年)
+    eps = statements.dropna(subset=["eps"]).groupby("code").tail(4).groupby("code")
+    span = (eps["period"].max() - eps["period"].min()).dt.days
+    eps_ttm = eps["eps"].sum().where((eps["eps"].count() == 4) & (span <= 280)).reindex(latest.index)
+    book = (statements["equity"] / statements["shares"]).groupby(statements["code"]).last()
+    year_ago = statements[["code", "period", "revenue"]].assign(period=statements["period"] + pd.DateOffset(years=1))
+    prior = latest[["period"]].reset_index().merge(year_ago, on=["code", "period"], how="left").set_index("code")["revenue"]
+    close = prices["close"].reindex(latest.index)
+    dividends = prices["dividends"].reindex(latest.index).fillna(0.0)
+    return pd.DataFrame({
+        "close": close,
+        "eps_ttm": eps_ttm,
+        "pe": close / eps_ttm.where(eps_ttm > 0),
+        "pb": close / book.where(book > 0),
+        "dividend_yield": dividends / close.where(close > 0),
+        "period": latest["period"].dt.strftime('%Y-%m-%d'),
+        "revenue": latest["revenue"],
+        "revenue_yoy": latest["revenue"] / prior.where(prior > 0) - 1,
+        "net_margin": latest["net_income"] / latest["revenue"].where(latest["revenue"] > 0),
+    })
+
+def valuation_metrics(statements, close, dividends=0.0):
+    """一檔的估值 (與 valuation 快照同一套算法)；statements 為 load_statements 的結果"""
+    if statements.empty: return dict.fromkeys(VALUATION_COLUMNS[3:], np.nan)
+    long = statements.rename_axis("period").reset_index().assign(code="")
+    prices = pd.DataFrame({"close": [close], "dividends": [dividends]}, index=[""])
+    return _valuation_frame(long, prices).iloc[0].drop("close").to_dict()
+
+def dividends_ttm(bars):
+    """最後一根往前一年 (365 天) 的現金股利合計；bars 為 K 棒表 (含 dividends 欄)"""
+    if bars.empty or 'dividends' not in bars: return 0.0
+    return float(bars.loc[bars.index > bars.index[-1] - pd.Timedelta(days=365), 'dividends'].fillna(0).sum())
+
+def _latest_prices(tickers):
+    """各完整代碼的最後日期、收盤與近一年股利 (規則同 dividends_ttm)，由本地 K 棒庫分批查出"""
+    since = (date.today() - timedelta(days=400)).isoformat()
+    frames = []
+    con = _connect_bar_store()
+    try:
+        for i in range(0, len(tickers), 500):
+            part = tickers[i:i + 500]
+            marks = ", ".join("?" * len(part))
+            rows = pd.read_sql_query(f"SELECT ticker, date, close, dividends FROM bars WHERE ticker IN ({marks}) AND date >= ? ORDER BY ticker, date",
+                                     con, params=[*part, since], parse_dates=["date"])
+            if rows.empty: continue
+            last = rows.groupby("ticker").tail(1).set_index("ticker")
+            recent = rows["date"] > rows["ticker"].map(last["date"]) - pd.Timedelta(days=365)
+            frames.append(last.assign(dividends=rows["dividends"].where(recent).fillna(0).groupby(rows["ticker"]).sum()))
+    finally:
+        con.close()
+    return pd.concat(frames) if frames else pd.DataFrame(columns=["date", "close", "dividends"])
+
+def refresh_valuation():
+    """以本地季報 + 本地 K 棒重算全市場估值快照 (valuation 表)；匯入或收盤更新 K 棒後呼叫"""
+    con = _connect()
+    try:
+        statements = pd.read_sql_query(f"SELECT code, period, {', '.join(STATEMENT_COLUMNS)} FROM statements ORDER BY code, period",
+                                       con, parse_dates=["period"])
+    finally:
+        con.close()
+    master = load_symbol_master()
+    codes = statements["code"].unique()
+    candidates = {code: [f"{code}{s}" for s in candidate_suffixes(code)] for code in codes}
+    prices = _latest_prices([t for ts in candidates.values() for t in ts]) if os.path.exists(BAR_DB) else _latest_prices([])
+    # 上市 / 上櫃都試過時取主檔優先的那一個
+    ticker = {code: next((t for t in candidates[code] if t in prices.index), None) for code in codes}
+    by_code = prices.reindex([ticker[c] for c in codes]).set_axis(codes)
+    table = _valuation_frame(statements, by_code)
+    table.insert(0, "industry", [master[c].industry if c in master else "" for c in table.index])
+    table.insert(1, "date", pd.to_datetime(by_code["date"]).dt.strftime('%Y-%m-%d'))
+    con = _connect()
+    try:
+        with con:
+            con.execute("DELETE FROM valuation")
+            table[VALUATION_COLUMNS].astype(object).where(table[VALUATION_COLUMNS].notna(), None).to_sql(
+                "valuation", con, if_exists="append", index_label="code")
+    finally:
+        con.close()
+    return len(table)
+
+def load_valuation():
+    """全市場估值快照 (每檔一列，索引為代碼)；數值欄一律為 float (整欄都是 NULL 時 sqlite 讀回來是 object)"""
+    con = _connect()
+    try: table = pd.read_sql_query("SELECT * FROM valuation", con, index_col="code")
+    finally: con.close()
+    numeric = [c for c in VALUATION_COLUMNS if c not in ("industry", "date", "period")]
+    return table.astype(dict.fromkeys(numeric, float))
+
+def sector_percentile(column="pe", table=None):
+    """各檔 column 在同產業內 (含自己) 的百分位 (0~1，愈小代表數值愈低，同值取平均名次)；本益比只比較獲利為正者"""
+    table = load_valuation() if table is None else table
+    values = table[column].where(table[column] > 0) if column == "pe" else table[column]
+    return values.groupby(table['industry']).rank(pct=True)
+
+def top_by(column="revenue_yoy", n=50, industry=None, table=None):
+    """column 由高到低前 n 名 (可限定產業)，例如營收年增率前 50 名"""
+    table = load_valuation() if table is None else table
+    if industry: table = table[table['industry'] == industry]
+    return table.dropna(subset=[column]).nlargest(n, column)
+
+def financial_metrics(stock_code, statements, bars, table=None):
+    """營收與獲利頁用的顯示值：(PE / EPS / 殖利率 / PB / 產業百分位 字串, 近五季營收與淨利表)。
+    估值用 bars 的最後收盤即時推算，產業百分位以即時本益比代入 valuation 快照後用 sector_percentile 計算"""
+    metrics = {"PE": "N/A", "EPS": "N/A", "Yield": "N/A", "PB": "N/A", "PE 產業百分位": "N/A"}
+    chart_df = pd.DataFrame()
+    if statements.empty or bars.empty: return metrics, chart_df
+    v = valuation_metrics(statements, float(bars['close'].iloc[-1]), dividends_ttm(bars))
+    if pd.notna(v['pe']): metrics['PE'] = f"{v['pe']:.2f}"
+    if pd.notna(v['eps_ttm']): metrics['EPS'] = f"{v['eps_ttm']:.2f}"
+    if pd.notna(v['dividend_yield']) and v['dividend_yield']: metrics['Yield'] = f"{v['dividend_yield']*100:.2f}%"
+    if pd.notna(v['pb']): metrics['PB'] = f"{v['pb']:.2f}"
+
+    table = load_valuation() if table is None else table
+    info = load_symbol_master().get(stock_code)
+    if pd.notna(v['pe']) and v['pe'] > 0 and info and info.industry:
+        sector = table.loc[(table['industry'] == info.industry) & (table.index != stock_code), ['industry', 'pe']]
+        # 同產業沒有其他獲利為正的公司時不顯示 (只有自己一定是 100%)
+        if (sector['pe'] > 0).any():
+            sector.loc[stock_code] = [info.industry, v['pe']]
+            metrics['PE 產業百分位'] = f"{sector_percentile('pe', sector)[stock_code]*100:.0f}%"
+
+    recent = statements[['revenue', 'net_income']].dropna(how="all").tail(5)
+    chart_df = recent.rename(columns={"revenue": "Revenue", "net_income": "Net Income"})
+    chart_df.index = chart_df.index.to_period("Q").strftime('%Y-Q%q')
+    return metrics, chart_df
@@ -0,0 +1,128 @@
+"""技術指標 (完整版：含 ADX, OBV, ATR)"""
+import numpy as np
+
+from . import kernel
+from .extrema import WindowExtrema
+from .metrics import METRICS
+
+def _rsv(close, extrema):
+    rsv_min = extrema.min(9)
+    rsv_max = extrema.max(9)
+    rsv_den = rsv_max - rsv_min
+    rsv_den = rsv_den.mask(rsv_den == 0, 1)
+    return (close - rsv_min) / rsv_den * 100
+
+def _rsi(delta):
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def _true_range(high, low, close):
+    prev_close = close.shift(1)
+    hl = high - low
+    hc = (high - prev_close).abs()
+    lc = (low - prev_close).abs()
+    return hl.where(hl > lc, lc).where(hl > hc, hc).fillna(0)
+
+# 指標登錄表：名稱 -> (相依欄位, 計算函式, 至少需要的 K 棒數)
+# 底線開頭者為中間值，只在被需要時計算、算完即丟，不會出現在結果中
+INDICATORS = {
+    # MA & Volume MA
+    '_SMA20': (('close',), lambda c: c.rolling(20).mean(), 0),
+    'MA5': (('close',), lambda c: c.rolling(5).mean(), 5),
+    'MA10': (('close',), lambda c: c.rolling(10).mean(), 10),
+    'MA20': (('_SMA20',), lambda m: m, 20),
+    'MA60': (('close',), lambda c: c.rolling(60).mean(), 60),
+    'VolMA5': (('volume',), lambda v: v.rolling(5).mean(), 5),
+    # 滑動高低點 (各窗長共用一個記憶物件) & 長線目標
+    '_Extrema': (('high', 'low'), WindowExtrema, 0),
+    'High120': (('_Extrema',), lambda e: e.max(120, min_periods=1), 0),
+    # KD & MACD & RSI & BB & BBW
+    '_RSV': (('close', '_Extrema'), _rsv, 0),
+    'K': (('_RSV',), lambda r: r.ewm(com=2).mean(), 0),
+    'D': (('K',), lambda k: k.ewm(com=2).mean(), 0),
+    '_EXP12': (('close',), lambda c: c.ewm(span=12, adjust=False).mean(), 0),
+    '_EXP26': (('close',), lambda c: c.ewm(span=26, adjust=False).mean(), 0),
+    'MACD': (('_EXP12', '_EXP26'), lambda e12, e26: e12 - e26, 0),
+    'Signal': (('MACD',), lambda m: m.ewm(span=9, adjust=False).mean(), 0),
+    'Hist': (('MACD', 'Signal'), lambda m, s: m - s, 0),
+    '_Delta': (('close',), lambda c: c.diff(), 0),
+    'RSI': (('_Delta',), _rsi, 0),
+    'BB_Mid': (('_SMA20',), lambda m: m, 0),
+    '_BB_Std': (('close',), lambda c: c.rolling(window=20).std(), 0),
+    'BB_Up': (('BB_Mid', '_BB_Std'), lambda m, s: m + 2 * s, 0),
+    'BB_Low': (('BB_Mid', '_BB_Std'), lambda m, s: m - 2 * s, 0),
+    'BBW': (('BB_Up', 'BB_Low', 'BB_Mid'), lambda u, l, m: (u - l) / m, 0),
+    # --- 進階指標：OBV & ADX & ATR ---
+    'OBV': (('_Delta', 'volume'), lambda d, v: (np.sign(d) * v).fillna(0).cumsum(), 0),
+    '_UpMove': (('high',), lambda h: h - h.shift(1), 0),
+    '_DownMove': (('low',), lambda l: l.shift(1) - l, 0),
+    '_+DM': (('_UpMove', '_DownMove'), lambda up, dn: up.where((up > dn) & (up > 0), 0), 0),
+    '_-DM': (('_UpMove', '_DownMove'), lambda up, dn: dn.where((dn > up) & (dn > 0), 0), 0),
+    '_TR': (('high', 'low', 'close'), _true_range, 0),
+    'ATR': (('_TR',), lambda tr: tr.ewm(span=14, adjust=False).mean(), 0),
+    '_+DM_EMA': (('_+DM',), lambda dm: dm.ewm(span=14, adjust=False).mean(), 0),
+    '_-DM_EMA': (('_-DM',), lambda dm: dm.ewm(span=14, adjust=False).mean(), 0),
+    '+DI': (('_+DM_EMA', 'ATR'), lambda dm, atr: (dm / atr) * 100, 0),
+    '-DI': (('_-DM_EMA', 'ATR'), lambda dm, atr: (dm / atr) * 100, 0),
+    '_DX': (('+DI', '-DI'), lambda p, m: (abs(p - m) / (p + m)) * 100, 0),
+    'ADX': (('_DX',), lambda dx: dx.ewm(span=14, adjust=False).mean(), 0),
+    # 量能趨勢
+    '_Vol_Shift1': (('volume',), lambda v: v.shift(1), 0),
+    '_Vol_Shift2': (('volume',), lambda v: v.shift(2), 0),
+    'Vol_Inc': (('volume', '_Vol_Shift1', '_Vol_Shift2'), lambda v, s1, s2: (v > s1) & (s1 > s2), 0),
+    'Vol_Dec': (('volume', '_Vol_Shift1', '_Vol_Shift2'), lambda v, s1, s2: (v < s1) & (s1 < s2), 0),
+}
+INDICATOR_COLUMNS = [name for name in INDICATORS if not name.startswith('_')]
+# 評分、訊號診斷、操盤室與回測會用到的欄位
+SIGNAL_COLUMNS = ['MA5', 'MA20', 'MA60', 'VolMA5', 'K', 'D', 'MACD', 'Hist', 'RSI', 'BB_Up', 'BBW',
+                  'ATR', 'ADX', 'OBV', 'Vol_Inc', 'Vol_Dec', 'High120']
+# 副圖選項 -> 需要的欄位 (Volume 直接用原始量)
+CHART_COLUMNS = {"Volume": [], "KD": ['K', 'D'], "MACD": ['MACD', 'Signal', 'Hist'], "RSI": ['RSI'],
+                 "BB": ['BB_Up', 'BB_Mid', 'BB_Low'], "ADX": ['ADX'], "OBV": ['OBV']}
+
+def view_columns(mas, inds):
+    """目前畫面 (均線 + 副圖) 加上訊號分析所需的指標欄位"""
+    cols = SIGNAL_COLUMNS + list(mas) + [c for ind in inds for c in CHART_COLUMNS.get(ind, [])]
+    return list(dict.fromkeys(cols))
+
+def _resolve(columns):
+    """依相依關係排出計算順序 (只含 columns 需要的指標)"""
+    order, seen = [], set()
+    def visit(name):
+        if name in seen or name not in INDICATORS: return
+        seen.add(name)
+        for dep in INDICATORS[name][0]: visit(dep)
+        order.append(name)
+    for name in columns: visit(name)
+    return order
+
+def _compute_indicators(src, columns=None):
+    """只計算 columns 及其相依項；src 的價量欄位可為單檔 Series，也可為 (日期 × 代碼) 對齊的寬表"""
+    columns = INDICATOR_COLUMNS if columns is None else columns
+    n_rows = len(src['close'])
+    values = {}
+    # KD / MACD / OBV / ATR / ADX 這類遞迴指標交給融合核心一次算完，其餘照登錄表
+    if kernel.AVAILABLE and any(name in kernel.FUSED_COLUMNS for name in columns):
+        values['_Extrema'] = WindowExtrema(src['high'], src['low'])
+        rsv = _rsv(src['close'], values['_Extrema'])
+        values.update(kernel.fused_indicators(src['high'], src['low'], src['close'], src['volume'], rsv))
+        columns_left = [name for name in columns if name not in values]
+    else:
+        columns_left = columns
+    for name in _resolve(columns_left):
+        deps, func, min_rows = INDICATORS[name]
+        if name in values or n_rows < min_rows: continue
+        values[name] = func(*(values[d] if d in values else src[d] for d in deps))
+    return {name: values[name] for name in columns if name in values}
+
+def calculate_indicators(df, columns=None):
+    """columns 為 None 時計算全部公開指標；否則只算指定欄位 (中間值不保留)"""
+    with METRICS.timed("indicators"):
+        try: return df.assign(**_compute_indicators(df, columns))
+        except Exception: return df.copy()
+
+def calculate_indicators_panel(panel, columns=None):
+    """與 calculate_indicators 同一套登錄表，一次算完整個寬表 (每欄一檔)"""
+    return {**panel, **_compute_indicators(panel, columns)}
@@ -0,0 +1,103 @@
+"""路徑相依指標 (KD / MACD / OBV / TR -> ATR -> ±DI -> DX -> ADX) 的單趟融合運算
+
+直接在連續的 float64 陣列上逐列走一次，同時推進所有 EMA 累加器，不產生中間 Series。
+EMA 用的是 pandas ewm().mean() 的同一條遞迴 (與 engine._Ewm 相同)，結果與 pandas 版逐位元一致。
+有安裝 numba 時 JIT 編譯 (編譯結果快取在 __pycache__)；沒有 numba，或 STOCK_KERNEL=pandas 時，
+indicators 會回到登錄表逐項以 pandas 計算。
+"""
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+# 融合核心產出的欄位 (順序即輸出陣列的第一維)
+FUSED_COLUMNS = ['K', 'D', 'MACD', 'Signal', 'Hist', 'OBV', 'ATR', '+DI', '-DI', 'ADX']
+# 各 EMA 的 (alpha, adjust)，依序為 K, D, EXP12, EXP26, Signal, ATR, +DM, -DM, ADX；
+# K/D 為 ewm(com=2)，其餘為 ewm(span=n, adjust=False)，com = (span - 1) / 2，alpha 的算法同 pandas
+_EMA_ALPHA = 1. / (1. + np.array([2.0, 2.0, 5.5, 12.5, 4.0, 6.5, 6.5, 6.5, 6.5]))
+_EMA_ADJUST = np.array([True, True, False, False, False, False, False, False, False])
+
+def _ewm_step(state, m, cur, alpha, adjust):
+    """pandas ewm().mean() 的一步 (ignore_na=False, min_periods=0)；state[m] 為 (weighted, old_wt, nobs)"""
+    new_wt = 1. if adjust else alpha
+    is_obs = cur == cur
+    if is_obs: state[m, 2] += 1
+    w = state[m, 0]
+    if w == w:
+        state[m, 1] *= 1. - alpha
+        if is_obs:
+            if w != cur:
+                state[m, 0] = (state[m, 1] * w + new_wt * cur) / (state[m, 1] + new_wt)
+            state[m, 1] = state[m, 1] + new_wt if adjust else 1.
+    elif is_obs:
+        state[m, 0] = cur
+    return state[m, 0] if state[m, 2] >= 1 else np.nan
+
+def _fused_kernel(high, low, close, volume, rsv, alpha, adjust, out):
+    """輸入皆為 (列 × 檔) 陣列 (欄優先，每檔連續)；out 為 (len(FUSED_COLUMNS) × 檔 × 列)。逐檔由舊到新走一次"""
+    n_rows, n_cols = close.shape
+    state = np.empty((alpha.shape[0], 3))
+    for j in range(n_cols):
+        state[:, 0], state[:, 1], state[:, 2] = np.nan, 1., 0.
+        obv = 0.
+        ph = pl = pc = np.nan
+        for i in range(n_rows):
+            h, l, c, v = high[i, j], low[i, j], close[i, j], volume[i, j]
+            k = _ewm_step(state, 0, rsv[i, j], alpha[0], adjust[0])
+            d = _ewm_step(state, 1, k, alpha[1], adjust[1])
+            macd = _ewm_step(state, 2, c, alpha[2], adjust[2]) - _ewm_step(state, 3, c, alpha[3], adjust[3])
+            signal = _ewm_step(state, 4, macd, alpha[4], adjust[4])
+
+            # OBV：(sign(差) × 量).fillna(0).cumsum()
+            delta = c - pc
+            sign = 1. if delta > 0 else (-1. if delta < 0 else (0. if delta == 0 else np.nan))
+            term = sign * v
+            if term != term: term = 0.
+            obv = term if i == 0 else obv + term
+
+            # TR：與 _true_range 的兩段 where 相同 (第二段比的是 hl 而非前一段的結果)
+            hl, hc, lc = h - l, abs(h - pc), abs(l - pc)
+            tr = hl if hl > lc else lc
+            if not hl > hc: tr = hc
+            if tr != tr: tr = 0.
+            atr = _ewm_step(state, 5, tr, alpha[5], adjust[5])
+
+            up, down = h - ph, pl - l
+            plus_dm = up if (up > down) and (up > 0) else 0.
+            minus_dm = down if (down > up) and (down > 0) else 0.
+            plus_di = (_ewm_step(state, 6, plus_dm, alpha[6], adjust[6]) / atr) * 100
+            minus_di = (_ewm_step(state, 7, minus_dm, alpha[7], adjust[7]) / atr) * 100
+            dx = (abs(plus_di - minus_di) / (plus_di + minus_di)) * 100
+            adx = _ewm_step(state, 8, dx, alpha[8], adjust[8])
+
+            out[0, j, i], out[1, j, i], out[2, j, i], out[3, j, i], out[4, j, i] = k, d, macd, signal, macd - signal
+            out[5, j, i], out[6, j, i], out[7, j, i], out[8, j, i], out[9, j, i] = obv, atr, plus_di, minus_di, adx
+            ph, pl, pc = h, l, c
+
+# numba 載入與編譯都要時間，第一次用到時才做 (匯入本模組不載入 numba)
+AVAILABLE = importlib.util.find_spec("numba") is not None and os.environ.get("STOCK_KERNEL", "numba") != "pandas"
+_KERNEL = None
+
+def _compiled_kernel():
+    global _KERNEL, _ewm_step
+    if _KERNEL is None:
+        from numba import njit
+        # error_model='numpy'：除以 0 得 inf / NaN (與 pandas 相同) 而不是丟例外
+        _ewm_step = njit(cache=True, error_model='numpy', inline='always')(_ewm_step)
+        _KERNEL = njit(cache=True, error_model='numpy')(_fused_kernel)
+    return _KERNEL
+
+def _as_2d(x):
+    """(列 × 檔) 的欄優先陣列；寬表本來就是逐檔連續存放，通常不必複製"""
+    return np.asfortranarray(x.to_numpy(dtype=np.float64).reshape(len(x), -1))
+
+def fused_indicators(high, low, close, volume, rsv):
+    """輸入為單檔 Series 或 (日期 × 代碼) 寬表，回傳 {欄位: 同形狀的 Series / DataFrame}"""
+    arrays = [_as_2d(x) for x in (high, low, close, volume, rsv)]
+    n_rows, n_cols = arrays[2].shape
+    out = np.empty((len(FUSED_COLUMNS), n_cols, n_rows))
+    _compiled_kernel()(*arrays, _EMA_ALPHA, _EMA_ADJUST, out)
+    if isinstance(close, pd.DataFrame):
+        return {name: pd.DataFrame(out[k].T, index=close.index, columns=close.columns, copy=False) for k, name in enumerate(FUSED_COLUMNS)}
+    return {name: pd.Series(out[k, 0], index=close.index, copy=False) for k, name in enumerate(FUSED_COLUMNS)}
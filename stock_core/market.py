@@ -0,0 +1,212 @@
+"""跨股分析：N 檔收盤對齊成 (日期 × 代碼) 矩陣，算區間報酬、相對強弱 (對 0050 與同產業) 與兩兩滾動相關
+
+相關係數不建 N × N 的中間 DataFrame：只保存視窗內每一對股票的充分統計量 (共同樣本數、Σx、Σx²、Σxy)，
+以 block × N 的區塊做矩陣乘法累加；新的一天只加上當天、減去移出視窗那天的外積，
+每前進 window 天整個重算一次，避免加減累積誤差。2000 檔時四個統計量約 128 MB，區塊暫存另計。
+缺值的處理與 pandas DataFrame.corr(min_periods=...) 相同 (每對只用兩檔都有值的日子)。
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .bars import _connect_bar_store, load_bars_panel
+from .symbols import load_symbol_master
+
+BENCHMARK = "0050.TW"
+RETURN_WINDOWS = (5, 20, 60, 120, 240)
+CORR_WINDOW = 60
+CORR_BLOCK = 512
+
+def close_matrix(tickers, start=None):
+    """本地 K 棒庫的收盤價寬表 (日期 × 代碼)，欄位固定為 tickers (庫裡沒有的整欄 NaN)"""
+    panel = load_bars_panel(list(tickers), fields=['close'], start=start)
+    if not panel: return pd.DataFrame(columns=list(tickers), index=pd.DatetimeIndex([], name='date'), dtype=float)
+    return panel['close'].reindex(columns=list(tickers))
+
+def daily_returns(close):
+    """日報酬；停牌日 (當天沒有收盤) 為 NaN，復牌當天對停牌前最後一個收盤計算"""
+    return close / close.ffill().shift(1) - 1
+
+def window_returns(close, windows=RETURN_WINDOWS):
+    """最新一天的 n 日報酬 (代碼 × 窗長)；停牌沿用最後收盤，資料不足 n 天的為 NaN"""
+    prices = close.ffill()
+    last = prices.iloc[-1] if len(prices) else pd.Series(np.nan, index=close.columns)
+    return pd.DataFrame({f"{n}日報酬": last / prices.iloc[-1 - n] - 1 if len(prices) > n else np.nan
+                         for n in windows}, index=close.columns)
+
+def industries(tickers):
+    """代碼 -> 產業 (查不到或不是股票的為 NaN，不列入產業平均)"""
+    master = load_symbol_master()
+    def industry(ticker):
+        info = master.get(ticker.split('.')[0])
+        return info.industry if info is not None and info.type == "股票" and info.industry else np.nan
+    return pd.Series([industry(t) for t in tickers], index=tickers, dtype=object)
+
+def relative_strength(close, window=60, benchmark=BENCHMARK, sectors=None):
+    """相對強弱表 (每檔一列)：window 日報酬、相對大盤 (benchmark) 與相對產業 (同產業等權平均) 的超額報酬，
+    以及全體與產業內的報酬百分位 (0~100，越高越強)；sectors 預設由股票主檔查產業"""
+    ret = window_returns(close, (window,)).iloc[:, 0]
+    sectors = industries(close.columns) if sectors is None else sectors.reindex(close.columns)
+    bench = ret.get(benchmark, np.nan)
+    by_sector = ret.groupby(sectors)
+    return pd.DataFrame({
+        "產業": sectors,
+        f"{window}日報酬": ret,
+        "相對大盤": (1 + ret) / (1 + bench) - 1,
+        "相對產業": (1 + ret) / (1 + by_sector.transform('mean')) - 1,
+        "RS百分位": ret.rank(pct=True) * 100,
+        "產業內百分位": by_sector.rank(pct=True) * 100,
+    })
+
+class RollingCorrelation:
+    """最近 window 天日報酬的兩兩相關係數，逐日增量更新"""
+    def __init__(self, returns, window=CORR_WINDOW, min_periods=None, block=CORR_BLOCK):
+        self.columns = returns.columns
+        self.window, self.block = window, block
+        self.min_periods = max(2, window // 2 if min_periods is None else min_periods)
+        recent = returns.tail(window).to_numpy(dtype=np.float64)
+        # 平移不改變相關係數，只是讓 Σx² 與 (Σx)² 相減時少損失有效位數
+        count = (~np.isnan(recent)).sum(axis=0)
+        self._shift = np.nansum(recent, axis=0) / np.maximum(count, 1)
+        self._rows = deque(recent, maxlen=window)
+        self._rebuild()
+
+    def _prepare(self, rows):
+        """(平移後且缺值補 0 的報酬, 有值為 1 的遮罩)"""
+        x = rows - self._shift
+        valid = ~np.isnan(x)
+        return np.where(valid, x, 0.), valid.astype(np.float64)
+
+    def _blocks(self):
+        n = len(self.columns)
+        return [slice(i, min(i + self.block, n)) for i in range(0, n, self.block)]
+
+    def _rebuild(self):
+        n = len(self.columns)
+        x, m = self._prepare(np.array(self._rows).reshape(len(self._rows), n))
+        x2 = x * x
+        # [i, j] 只計入兩檔都有值的日子：n = Σm_i m_j、sx = Σx_i m_j、sxx = Σx_i² m_j、sxy = Σx_i x_j
+        self._n, self._sx, self._sxx, self._sxy = (np.empty((n, n)) for _ in range(4))
+        for rows in self._blocks():
+            self._n[rows] = m[:, rows].T @ m
+            self._sx[rows] = x[:, rows].T @ m
+            self._sxx[rows] = x2[:, rows].T @ m
+            self._sxy[rows] = x[:, rows].T @ x
+        self._pending = 0
+
+    def _apply(self, row, sign):
+        x, m = self._prepare(row)
+        for rows in self._blocks():
+            self._n[rows] += sign * np.outer(m[rows], m)
+            self._sx[rows] += sign * np.outer(x[rows], m)
+            self._sxx[rows] += sign * np.outer(x[rows] * x[rows], m)
+            self._sxy[rows] += sign * np.outer(x[rows], x)
+
+    def update(self, returns, replace=False):
+        """加入新一天的日報酬 (代碼 -> 報酬，缺的代碼視為 NaN)；replace=True 時取代最後一天 (盤中更新)"""
+        row = pd.Series(returns, dtype=float).reindex(self.columns).to_numpy()
+        if replace and self._rows:
+            self._apply(self._rows.pop(), -1)
+        elif len(self._rows) == self.window:
+            self._apply(self._rows.popleft(), -1)
+        self._rows.append(row)
+        self._pending += 1
+        if self._pending >= self.window: self._rebuild()
+        else: self._apply(row, 1)
+
+    def _corr(self, i, j):
+        """列 i、欄 j (索引陣列或 slice) 的相關係數區塊"""
+        count, sx, sxx, sxy = (a[i][:, j] for a in (self._n, self._sx, self._sxx, self._sxy))
+        sy, syy = self._sx[j][:, i].T, self._sxx[j][:, i].T
+        with np.errstate(all='ignore'):
+            var_x, var_y = count * sxx - sx * sx, count * syy - sy * sy
+            corr = (count * sxy - sx * sy) / np.sqrt(var_x * var_y)
+        corr[(count < self.min_periods) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+        return np.clip(corr, -1., 1.)
+
+    def matrix(self, tickers=None):
+        """相關係數 (代碼 × 代碼)，tickers 給定時只算這幾檔；共同樣本少於 min_periods 或任一邊沒有波動的為 NaN"""
+        columns = self.columns if tickers is None else pd.Index(tickers)
+        index = self.columns.get_indexer(columns)
+        if (index < 0).any(): raise KeyError(f"unknown tickers: {list(columns[index < 0])}")
+        out = np.empty((len(index), len(index)))
+        for rows in [slice(k, k + self.block) for k in range(0, len(index), self.block)]:
+            out[rows] = self._corr(index[rows], index)
+        same = index[:, None] == index[None, :]
+        out[same & ~np.isnan(out)] = 1.
+        return pd.DataFrame(out, index=columns, columns=columns, copy=False)
+
+    def top(self, ticker, n=20):
+        """與 ticker 相關最高的 n 檔 (不含自己)，只算 ticker 那一列"""
+        j = self.columns.get_loc(ticker)
+        corr = self._corr([j], slice(None))[0]
+        corr[j] = np.nan
+        return pd.Series(corr, index=self.columns, name=ticker).dropna().nlargest(n)
+
+class MarketMatrix:
+    """N 檔收盤的對齊矩陣 + 滾動相關，隨新 K 棒增量前進；多個執行緒共用時以鎖保護
+
+    只保留最長報酬窗長所需的最近幾天；refresh() 從本地 K 棒庫讀進最後一天 (含) 之後的資料，
+    最後一天有變動 (盤中更新) 時取代而不是重複加入。
+    """
+    def __init__(self, close, corr_window=CORR_WINDOW, block=CORR_BLOCK, keep=max(RETURN_WINDOWS) + 1):
+        close = close.sort_index()
+        self.keep = max(keep, corr_window + 1)
+        self.close = close.tail(self.keep)
+        self.sectors = industries(close.columns)
+        self.corr = RollingCorrelation(daily_returns(self.close).tail(corr_window), corr_window, block=block)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, tickers, **kwargs):
+        """由本地 K 棒庫建立，只讀最近約 keep 個交易日的收盤"""
+        keep = max(kwargs.get('keep', max(RETURN_WINDOWS) + 1), kwargs.get('corr_window', CORR_WINDOW) + 1)
+        con = _connect_bar_store()
+        try: latest = con.execute("SELECT MAX(date) FROM bars").fetchone()[0]
+        finally: con.close()
+        start = None if latest is None else (pd.Timestamp(latest) - pd.Timedelta(days=keep * 3 // 2 + 30)).strftime('%Y-%m-%d')
+        return cls(close_matrix(tickers, start=start), **kwargs)
+
+    @property
+    def tickers(self):
+        return self.close.columns
+
+    def append(self, date, closes):
+        """加入一天的收盤 (代碼 -> 收盤)；date 與最後一天相同時視為盤中更新，取代最後一天"""
+        date = pd.Timestamp(date)
+        row = pd.Series(closes, dtype=float).reindex(self.tickers)
+        with self._lock:
+            replace = len(self.close) > 0 and date == self.close.index[-1]
+            if len(self.close) and date < self.close.index[-1]: return False
+            history = self.close.iloc[:-1] if replace else self.close
+            prev = history.ffill().iloc[-1] if len(history) else pd.Series(np.nan, index=self.tickers)
+            self.corr.update(row / prev - 1, replace=replace)
+            if replace: self.close.iloc[-1] = row.to_numpy()
+            else: self.close = pd.concat([self.close, row.to_frame(date).T]).tail(self.keep)
+        return True
+
+    def refresh(self):
+        """讀入 K 棒庫裡最後一天 (含) 之後的收盤，回傳處理的天數"""
+        start = self.close.index[-1].strftime('%Y-%m-%d') if len(self.close) else None
+        new = close_matrix(self.tickers, start=start)
+        if len(self.close):
+            last = self.close.iloc[-1]
+            # 最後一天沒變就不必重算
+            if len(new) and new.index[0] == self.close.index[-1] and new.iloc[0].equals(last): new = new.iloc[1:]
+        for date, row in new.iterrows(): self.append(date, row)
+        return len(new)
+
+    def returns(self, windows=RETURN_WINDOWS):
+        with self._lock: return window_returns(self.close, windows)
+
+    def relative_strength(self, window=60, benchmark=BENCHMARK):
+        with self._lock: return relative_strength(self.close, window, benchmark, self.sectors)
+
+    def correlation(self, tickers=None):
+        """tickers 給定時只取這幾檔的子矩陣"""
+        with self._lock: return self.corr.matrix(tickers)
+
+    def top_correlated(self, ticker, n=20):
+        with self._lock: return self.corr.top(ticker, n)
@@ -0,0 +1,64 @@
+"""分段計時與快取命中統計 (全行程共用)"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# STOCK_METRICS_LOG=路徑：每次 rerun 追加一行 JSON
+METRICS_LOG = os.environ.get("STOCK_METRICS_LOG")
+_CURRENT_RUN = contextvars.ContextVar("current_run", default=None)
+
+class Metrics:
+    """全行程累計的分段耗時與快取事件；外部元件 (上游連線、圖檔快取) 以 register 掛上自己的統計"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.caches = {}
+        self.sources = {}
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try: yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                s = self.stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+                s["count"] += 1
+                s["total"] += elapsed
+                s["max"] = max(s["max"], elapsed)
+            run = _CURRENT_RUN.get()
+            if run is not None: run[stage] = run.get(stage, 0.0) + elapsed
+
+    def count(self, cache, event, n=1):
+        with self._lock:
+            c = self.caches.setdefault(cache, {"hits": 0, "misses": 0, "evictions": 0})
+            c[event] = c.get(event, 0) + n
+
+    def register(self, name, stats_fn):
+        self.sources[name] = stats_fn
+
+    def snapshot(self):
+        with self._lock:
+            snap = {"stages": {k: dict(v) for k, v in self.stages.items()},
+                    "caches": {k: dict(v) for k, v in self.caches.items()}}
+        for name, stats_fn in list(self.sources.items()): snap[name] = stats_fn()
+        return snap
+
+    def begin_run(self):
+        """開始一次 rerun 的計時；背景抓取執行緒透過 contextvars 記到同一筆"""
+        run = {}
+        _CURRENT_RUN.set(run)
+        return run, time.perf_counter()
+
+    def end_run(self, run, started, **labels):
+        run["rerun"] = time.perf_counter() - started
+        _CURRENT_RUN.set(None)
+        if not METRICS_LOG: return
+        record = {"ts": time.time(), **labels, "stages": run, **self.snapshot()}
+        with self._lock, open(METRICS_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+METRICS = Metrics()
@@ -0,0 +1,144 @@
+"""參數最佳化：在多檔、多年的歷史上掃描評分與策略門檻 (StrategyParams)，依回測報酬與風險排序
+
+指標只算一次：整個寬表 (含所有候選均線與 BBW 分位數) 寫成 .npy 後由各行程以唯讀 memmap 開啟，
+每組參數只重跑門檻判斷與回測，不重算指標，也不會每個行程各複製一份。
+
+    python -m stock_core optimize --sector 半導體業 --samples 2000 --start 2018-01-01
+"""
+import itertools
+import os
+import pickle
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .backtest import backtest_signals, strategy_signals
+from .bars import load_bars_panel, panel_by_date
+from .indicators import SIGNAL_COLUMNS, calculate_indicators_panel
+from .strategy import StrategyParams
+
+# 預設的搜尋範圍 (每個參數的候選值)；param_grid / param_samples 可逐項覆寫
+PARAM_SPACE = {
+    "ma_fast": (3, 5, 10), "ma_mid": (10, 20, 30), "ma_slow": (40, 60, 120),
+    "adx_min": (20, 25, 30), "rsi_high": (70, 80, 90), "rsi_low": (10, 20, 30), "rsi_hot": (70, 75, 80),
+    "vol_ratio": (1.0, 1.2, 1.5), "bbw_quantile": (0.75, 0.85, 0.95), "k_max": (70, 80, 90),
+    "burst_score": (90, 95, 100),
+}
+RANK_COLUMNS = ("夏普值", "報酬回撤比", "組合年化報酬", "平均總報酬")
+
+def _space(choices):
+    unknown = set(choices) - set(StrategyParams._fields)
+    if unknown: raise ValueError(f"unknown parameters: {sorted(unknown)}")
+    return {**PARAM_SPACE, **{k: tuple(v) for k, v in choices.items()}}
+
+def _valid(params):
+    return params.ma_fast < params.ma_mid < params.ma_slow and params.rsi_low < params.rsi_high
+
+def param_grid(**choices):
+    """全部組合 (略過快中慢均線順序不對等無意義的組合)"""
+    space = _space(choices)
+    combos = (StrategyParams(**dict(zip(space, values))) for values in itertools.product(*space.values()))
+    return [params for params in combos if _valid(params)]
+
+def param_samples(n, seed=0, **choices):
+    """由搜尋範圍隨機抽 n 組不重複的參數 (範圍內的有效組合不足 n 組時全部回傳)"""
+    space = _space(choices)
+    if np.prod([len(v) for v in space.values()], dtype=float) <= n: return param_grid(**choices)
+    rng = random.Random(seed)
+    seen = set()
+    for _ in range(20 * n):
+        if len(seen) >= n: break
+        params = StrategyParams(**{k: rng.choice(v) for k, v in space.items()})
+        if _valid(params): seen.add(params)
+    return sorted(seen)
+
+def prepare_panel(panel, params_list, start=None, end=None):
+    """算好所有參數組合共用的指標：訊號欄位 + 每個候選均線 + 每個候選 BBW 分位數，
+    指標用全段資料暖機後再切到 [start, end] 的回測區間。
+    panel 以 K 棒序號對齊 (load_bars_panel(by_bar=True)) 時各檔只在自己的 K 棒上算指標，再放回日期軸組成投資組合"""
+    mas = sorted({n for params in params_list for n in (params.ma_fast, params.ma_mid, params.ma_slow)})
+    ind = calculate_indicators_panel(panel, SIGNAL_COLUMNS)
+    for n in mas:
+        if f'MA{n}' not in ind: ind[f'MA{n}'] = ind['close'].rolling(n).mean()
+    for q in sorted({params.bbw_quantile for params in params_list}):
+        ind[f'BBW_Q{q:g}'] = ind['BBW'].rolling(60, min_periods=1).quantile(q)
+    dates = ind.pop('date', None)
+    ind = {k: v for k, v in ind.items() if isinstance(v, pd.DataFrame)}
+    if dates is not None: ind = panel_by_date(ind, dates)
+    return {k: v.loc[start:end] for k, v in ind.items()}
+
+def evaluate(ind, params):
+    """以一組參數回測整個寬表，回傳一列：參數 + 逐檔平均績效 + 等權重組合的報酬與風險"""
+    bt, equity = backtest_signals(ind, strategy_signals(ind, params))
+    daily = equity.pct_change().fillna(0.0).mean(axis=1)  # 每日等權重再平衡
+    curve = (1 + daily).cumprod()
+    years = max(len(daily) / 252, 1 / 252)
+    annual = curve.iloc[-1] ** (1 / years) - 1
+    drawdown = (curve / curve.cummax() - 1).min()
+    std = daily.std()
+    trades = bt['交易次數'].sum()
+    return {**params._asdict(),
+            "交易次數": int(trades),
+            "勝率": (bt['勝率'] * bt['交易次數']).sum() / trades if trades else np.nan,
+            "平均總報酬": bt['總報酬'].mean(),
+            "平均最大回撤": bt['最大回撤'].mean(),
+            "組合年化報酬": annual,
+            "組合最大回撤": drawdown,
+            "夏普值": daily.mean() / std * np.sqrt(252) if std > 0 else np.nan,
+            "報酬回撤比": annual / -drawdown if drawdown < 0 else np.nan}
+
+# 行程池共用的寬表：主行程寫成 .npy，各行程以唯讀 memmap 開啟
+_SHARED = None
+
+def _share(ind, directory):
+    """把寬表逐欄寫到 directory，回傳給 _attach 用的說明 (路徑與索引)"""
+    first = next(iter(ind.values()))
+    paths = {}
+    for i, (name, frame) in enumerate(ind.items()):
+        paths[name] = os.path.join(directory, f"{i}.npy")
+        np.save(paths[name], frame.to_numpy())
+    return pickle.dumps((first.index, first.columns, paths))
+
+def _attach(manifest):
+    global _SHARED
+    index, columns, paths = pickle.loads(manifest)
+    _SHARED = {name: pd.DataFrame(np.load(path, mmap_mode='r'), index=index, columns=columns, copy=False)
+               for name, path in paths.items()}
+
+def _evaluate_shared(params):
+    return evaluate(_SHARED, params)
+
+def rank_results(results, sort_by="夏普值"):
+    """依 sort_by 由高到低排序 (NaN 排最後)，加上名次"""
+    if sort_by not in RANK_COLUMNS: raise ValueError(f"sort_by must be one of {RANK_COLUMNS}")
+    table = pd.DataFrame(results).sort_values(sort_by, ascending=False, na_position="last", ignore_index=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name="名次")
+    return table
+
+def run_optimization(tickers, params_list, start=None, end=None, workers=None, sort_by="夏普值", progress=None):
+    """在 tickers (本地 K 棒庫) 上回測 params_list 的每一組參數，回傳依 sort_by 排序的結果表"""
+    params_list = list(dict.fromkeys(params_list))
+    panel = load_bars_panel(list(tickers), by_bar=True)
+    if not panel or not params_list: return pd.DataFrame()
+    ind = prepare_panel(panel, params_list, start, end)
+    if len(ind['close']) < 60: return pd.DataFrame()
+
+    workers = workers or os.cpu_count() or 1
+    results = []
+    if workers == 1:
+        for i, params in enumerate(params_list):
+            results.append(evaluate(ind, params))
+            if progress: progress(i + 1, len(params_list))
+        return rank_results(results, sort_by)
+    with tempfile.TemporaryDirectory(prefix="stock-optimize-") as directory:
+        manifest = _share(ind, directory)
+        del ind
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(manifest,)) as pool:
+            chunksize = max(1, min(16, len(params_list) // (workers * 4)))
+            for i, row in enumerate(pool.map(_evaluate_shared, params_list, chunksize=chunksize)):
+                results.append(row)
+                if progress: progress(i + 1, len(params_list))
+    return rank_results(results, sort_by)
@@ -0,0 +1,67 @@
+"""全市場選股 (日期 × 代碼 矩陣批次運算)"""
+import logging
+
+import pandas as pd
+
+from .bars import load_bars_panel, update_bars
+from .indicators import SIGNAL_COLUMNS, calculate_indicators_panel
+from .strategy import _checklist_rules, _score_rules
+from .symbols import load_symbol_master
+from .upstream import UpstreamError
+
+log = logging.getLogger(__name__)
+
+def screen_panel(ind):
+    """以最後兩根 K 棒計算全體分數與健檢，回傳可排序的結果表；
+    ind 應以各檔自己的 K 棒對齊 (load_bars_panel(by_bar=True))，最後一列才是每檔各自的最後一根"""
+    last = {k: v.iloc[-1] for k, v in ind.items() if isinstance(v, pd.DataFrame)}
+    prev = {k: v.iloc[-2] for k, v in ind.items() if isinstance(v, pd.DataFrame)}
+    bbw_q85 = ind['BBW'].tail(60).quantile(0.85)
+    table = pd.DataFrame({
+        **({"日期": last['date']} if 'date' in last else {}),
+        "收盤": last['close'],
+        "漲跌%": (last['close'] / prev['close'] - 1) * 100,
+        "分數": _score_rules(last, prev, bbw_q85),
+        "ADX": last['ADX'],
+        "均線金叉": (prev['MA5'] < prev['MA20']) & (last['MA5'] > last['MA20']),
+        "ADX突破25": (prev['ADX'] <= 25) & (last['ADX'] > 25),
+        "量比": last['volume'] / last['VolMA5'],
+    })
+    for name, passed in _checklist_rules(last).items(): table[name] = passed
+    # 最後一根停牌或未上市者無法評分
+    return table[last['close'].notna()].sort_values("分數", ascending=False)
+
+def universe_tickers(types=("股票", "ETF")):
+    return [f"{code}{info.suffix}" for code, info in load_symbol_master().items() if info.type in types]
+
+def sector_tickers(industry, types=("股票",)):
+    """主檔中屬於 industry (產業別，例如「半導體業」) 的代碼"""
+    return [f"{code}{info.suffix}" for code, info in load_symbol_master().items()
+            if info.type in types and info.industry == industry]
+
+def update_universe_bars(tickers, progress=None, counts=None):
+    """逐檔增量更新 K 棒，回傳 {"ok": 檔數, "failed": 檔數}；單檔失敗 (上游或下市代碼的怪資料、資料庫錯誤等) 記下後繼續下一檔。
+    counts 給定時就地累加 (背景更新邊跑邊顯示)"""
+    counts = {"ok": 0, "failed": 0} if counts is None else counts
+    for i, ticker in enumerate(tickers):
+        try:
+            update_bars(ticker)
+            counts["ok"] += 1
+        except UpstreamError as e:
+            log.warning("update_bars %s: %s", ticker, e)
+            counts["failed"] += 1
+        except Exception:
+            log.exception("update_bars %s", ticker)
+            counts["failed"] += 1
+        if progress: progress(i + 1, len(tickers))
+    return counts
+
+def screen_tickers(tickers):
+    """從本地 K 棒庫對 tickers 全體評分，附上名稱"""
+    panel = load_bars_panel(tickers, by_bar=True)
+    if not panel or len(panel['close']) < 60: return pd.DataFrame()
+    table = screen_panel(calculate_indicators_panel(panel, SIGNAL_COLUMNS))
+    master = load_symbol_master()
+    table.insert(0, "名稱", [master[t.split(".")[0]].name if t.split(".")[0] in master else t for t in table.index])
+    table.index.name = "代碼"
+    return table
@@ -0,0 +1,202 @@
+"""深度 AI 策略分析 (含評分與多空健檢)"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .extrema import WindowExtrema
+
+FIB_WINDOWS = (20, 60, 240)  # 極短線 / 短線 / 長線
+
+# 評分與操盤建議的門檻；預設值即儀表板的規則。均線窗長不是預設值時，
+# 規則裡的 MA5 / MA20 / MA60 分別換成快 / 中 / 慢均線 (見 with_params)
+StrategyParams = namedtuple("StrategyParams", [
+    "ma_fast", "ma_mid", "ma_slow", "adx_min", "rsi_high", "rsi_low", "rsi_hot",
+    "vol_ratio", "bbw_quantile", "k_max", "burst_score"],
+    defaults=[5, 20, 60, 25, 80, 20, 75, 1.2, 0.85, 80, 95])
+DEFAULT_PARAMS = StrategyParams()
+
+def _moving_average(src, window):
+    """src 已有 MA{window} 欄 (或寬表) 就直接用，否則由收盤價計算"""
+    name = f'MA{window}'
+    return src[name] if name in src else src['close'].rolling(window).mean()
+
+def with_params(src, params):
+    """把 MA5 / MA20 / MA60 換成 params 的快 / 中 / 慢均線；src 為指標表或寬表對照，預設窗長時原樣回傳"""
+    windows = {'MA5': params.ma_fast, 'MA20': params.ma_mid, 'MA60': params.ma_slow}
+    mas = {name: _moving_average(src, n) for name, n in windows.items() if f'MA{n}' != name}
+    if not mas: return src
+    return src.assign(**mas) if isinstance(src, pd.DataFrame) else {**src, **mas}
+
+def _score_rules(last, prev, bbw_q85, params=DEFAULT_PARAMS):
+    """評分規則；last/prev 可為單列 Series，或各欄皆為同形狀 Series/DataFrame 的對照 (批次運算)"""
+    close = last['close']
+    score = 50
+
+    # 1. 趨勢 (40%)
+    score = score + 10 * (close > last['MA20']) + 10 * (last['MA20'] > last['MA60']) \
+                  + 10 * (close > last['MA60']) + 10 * (last['MA5'] > last['MA20'])
+    score = score - 10 * (close < last['MA20']) - 10 * (last['MA20'] < last['MA60']) \
+                  - 10 * (close < last['MA60']) - 10 * (last['MA5'] < last['MA20'])
+
+    # 2. 動能 (30%) - 考慮 ADX 濾鏡
+    adx = last.get('ADX')
+    adx_filter = True if adx is None else (adx > params.adx_min) | pd.isna(adx)
+    score = score + 5 * ((last['MACD'] > 0) & adx_filter) + 5 * ((last['Hist'] > 0) & adx_filter) \
+                  + 5 * ((last['K'] > last['D']) & adx_filter)
+
+    # RSI 修正
+    score = score - 5 * (last['RSI'] > params.rsi_high) + 5 * (last['RSI'] < params.rsi_low)
+
+    # 3. 量價 (20%)
+    vol_ratio = last['volume'] / last['VolMA5'] if last.get('VolMA5') is not None else 1
+    score = score + 5 * ((close > prev['close']) & (vol_ratio > params.vol_ratio)) - 5 * ((close < prev['close']) & (vol_ratio > params.vol_ratio))
+    if last.get('Vol_Inc') is not None: score = score + 5 * (last['Vol_Inc'] == True)
+
+    # 4. 突破 (10%)
+    if bbw_q85 is not None:
+        breakout = (last['BBW'] > bbw_q85) & (close > last['BB_Up'])
+        if isinstance(score, (pd.Series, pd.DataFrame)): score = score.mask(breakout, 100)
+        elif breakout: score = 100
+
+    if isinstance(score, (pd.Series, pd.DataFrame)): return score.clip(0, 100)
+    return int(max(0, min(100, score)))
+
+def _checklist_rules(last):
+    return {
+        "站上月線 (MA20)": last['close'] > last['MA20'],
+        "季線多頭 (MA60向上)": last['MA20'] > last['MA60'],
+        "KD金叉向上": last['K'] > last['D'],
+        "MACD偏多 (Hist > 0)": last['Hist'] > 0,
+        "RSI安全 (20~75)": (last['RSI'] > 20) & (last['RSI'] < 75)
+    }
+
+def calculate_score(df, params=DEFAULT_PARAMS):
+    df = with_params(df, params)
+    bbw_q85 = df['BBW'].tail(60).quantile(params.bbw_quantile) if 'BBW' in df.columns else None
+    return _score_rules(df.iloc[-1], df.iloc[-2], bbw_q85, params)
+
+def analyze_volume(df):
+    if 'VolMA5' not in df.columns: return "無量能資料"
+    last = df.iloc[-1]
+    
+    vol_trend_msg = ""
+    if 'Vol_Inc' in df.columns and last['Vol_Inc'] == True: vol_trend_msg = "🔥 3日連增"
+    elif 'Vol_Dec' in df.columns and last['Vol_Dec'] == True: vol_trend_msg = "❄️ 3日連縮"
+    
+    vol_ratio = last['volume'] / last['VolMA5']
+    status = "量平"
+    if vol_ratio > 1.5: status = "爆量"
+    elif vol_ratio > 1.2: status = "放量"
+    elif vol_ratio < 0.6: status = "窒息量"
+    elif vol_ratio < 0.8: status = "量縮"
+
+    return f"{status} ({vol_trend_msg if vol_trend_msg else '持平'})"
+
+def analyze_signals(df):
+    if len(df) < 2: return ["資料不足"]
+    last = df.iloc[-1]
+    prev = df.iloc[-2]
+    signals = []
+    
+    # ATR
+    if 'ATR' in df.columns and not pd.isna(df['ATR'].tail(20).mean()):
+        current_atr = last['ATR']
+        avg_atr = df['ATR'].tail(20).mean()
+        if current_atr > avg_atr * 1.5: signals.append(f"🚨 **波動度過高**：風險放大，建議減小部位。")
+        elif current_atr < avg_atr * 0.5: signals.append(f"😴 **波動度極低**：市場極度沉悶。")
+
+    # BB 突破
+    if 'BBW' in df.columns:
+        bbw_avg = df['BBW'].tail(60).mean()
+        if last['BBW'] < bbw_avg * 0.8: signals.append("🧘 **低波動整理**：布林通道收斂，等待大行情。")
+        elif last['close'] > last['BB_Up'] and last['BBW'] > bbw_avg * 1.2: signals.append("🚀 **趨勢突破確立**：股價創高且布林通道開口放大。")
+    
+    # MA
+    if 'MA5' in df.columns and 'MA20' in df.columns:
+        if last['MA5'] > last['MA20'] > last['MA60']: signals.append("🔥 **趨勢**：多頭排列")
+        if prev['MA5'] < prev['MA20'] and last['MA5'] > last['MA20']: signals.append("✨ **均線金叉**：5日穿月線")
+        if prev['MA5'] > prev['MA20'] and last['MA5'] < last['MA20']: signals.append("💀 **均線死叉**：5日破月線")
+        
+    # ADX & OBV
+    if 'ADX' in df.columns and not pd.isna(last['ADX']):
+        adx_val = last['ADX']
+        if adx_val > 40: signals.append(f"🚀 **ADX極強 ({adx_val:.1f})**：趨勢爆發，動能最強。")
+        elif adx_val > 25: signals.append(f"💪 **ADX強勢 ({adx_val:.1f})**：趨勢確立，可信度高。")
+        elif adx_val < 20: signals.append(f"🟰 **ADX疲弱 ({adx_val:.1f})**：進入盤整，訊號可信度低。")
+            
+    if 'OBV' in df.columns:
+        obv_trend = last['OBV'] > df['OBV'].iloc[-5:-1].mean()
+        price_up = last['close'] > df['close'].iloc[-5:-1].mean()
+        if obv_trend and price_up: signals.append("✅ **量價同步**：OBV上升，量能推動價格。")
+        elif not obv_trend and price_up: signals.append("❌ **量價背離**：價格上漲但OBV下降，動能不足。")
+        
+    return signals if signals else ["⚖️ 盤整中"]
+
+def generate_dual_strategy(df, params=DEFAULT_PARAMS):
+    if len(df) < 60: return None, None
+    score = calculate_score(df, params)
+    df = with_params(df, params)
+    last = df.iloc[-1]
+    last_close = last['close']
+    vol_status = analyze_volume(df)
+    
+    # 健檢清單
+    checklist = _checklist_rules(last)
+    
+    # 短線策略
+    short_term = {"title": "中性觀望", "icon": "⚖️", "color": "gray", "action": "觀望", "score": score, "vol": vol_status, "desc": "多空不明，等待訊號。"}
+    sl_short = last['MA20'] if 'MA20' in df.columns else last_close * 0.9
+    tp_short = last['BB_Up'] if 'BB_Up' in df.columns else last_close * 1.1
+
+    if score >= params.burst_score:
+        short_term.update({"title": "🚀 趨勢噴發", "icon": "🚀", "color": "green", "action": "現價佈局", 
+                         "desc": "訊號極強，已脫離整理區間。", "entry_text": f"建議現價或回測 **{last['MA5']:.2f}** 佈局。"})
+    elif last_close > last['MA20'] and last['K'] < params.k_max:
+        short_term.update({"title": "短多操作", "icon": "⚡", "color": "green", "action": "拉回佈局", 
+                         "desc": "股價站上月線，短線強勢。", "entry_text": f"建議拉回測試 **{last['MA20']:.2f}** 不破時佈局。"})
+        if last['RSI'] > params.rsi_hot: 
+            short_term.update({"title": "短線過熱", "icon": "🔥", "color": "orange", "action": "分批獲利", "desc": "雖為多頭但過熱，留意修正。"})
+    elif last_close < last['MA20']:
+        short_term.update({"title": "短線偏空", "icon": "📉", "color": "red", "action": "反彈減碼", 
+                         "desc": "跌破月線，短線轉弱。", "entry_text": "暫不建議進場，待站回月線。"})
+        tp_short = last['MA20']
+    
+    short_term["stop_loss"] = f"{sl_short:.2f}"
+    short_term["take_profit"] = f"{tp_short:.2f}"
+    short_term["checklist"] = checklist
+
+    # 長線策略
+    long_term = {"title": "中性持有", "icon": "🐢", "color": "gray", "action": "續抱", "desc": "趨勢盤整"}
+    sl_long = last['MA60'] if 'MA60' in df.columns else last_close * 0.85
+    tp_long = last['High120'] if 'High120' in df.columns else df['high'].tail(120).max()
+    if last_close > last['MA60']:
+        long_term.update({"title": "長線多頭", "icon": "🚀", "color": "green", "action": "波段續抱", "desc": "站穩季線，長多格局。"})
+    elif last_close < last['MA60']:
+        long_term.update({"title": "長線轉弱", "icon": "❄️", "color": "red", "action": "保守應對", "desc": "跌破季線，需提防反轉。"})
+        tp_long = last['MA60']
+
+    long_term["stop_loss"] = f"{sl_long:.2f}"
+    long_term["take_profit"] = f"{tp_long:.2f}"
+    return short_term, long_term
+
+def _fib_levels(h, l):
+    d = h - l
+    return {'0.0 (低)': l, '0.382': l+d*0.382, '0.5': l+d*0.5, '0.618': l+d*0.618, '1.0 (高)': h}
+
+def fibonacci_bands(df, window, extrema=None):
+    """整段歷史逐日的黃金分割價位 {位置: 序列}：每列取到該日為止 window 根的高低點 (不足 window 根為 NaN)。
+    df 可為單檔 K 棒表，或 high/low 為 (日期 × 代碼) 寬表的對照；extrema 可傳入共用的 WindowExtrema"""
+    extrema = extrema or WindowExtrema(df['high'], df['low'])
+    h, l = extrema.max(window, min_periods=1), extrema.min(window, min_periods=1)
+    valid = np.arange(len(h)) >= window - 1
+    if h.ndim == 2: valid = np.broadcast_to(valid[:, None], h.shape)
+    return _fib_levels(h.where(valid), l.where(valid))
+
+def calculate_fibonacci_multi(df, windows=FIB_WINDOWS):
+    """各窗長最新一根的黃金分割價位 (即 fibonacci_bands 的最後一列)；K 棒不足該窗長時為 {}。
+    只需要最後一列，所以只掃最長窗長那一段"""
+    recent = df.iloc[-max(windows):]
+    extrema = WindowExtrema(recent['high'], recent['low'])
+    return tuple(_fib_levels(extrema.max(w, min_periods=1).iloc[-1], extrema.min(w, min_periods=1).iloc[-1])
+                 if len(df) >= w else {} for w in windows)
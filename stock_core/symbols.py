@@ -0,0 +1,78 @@
+"""證券主檔：代碼 -> 名稱 / 市場 / 類型"""
+import functools
+import io
+import os
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from .config import DATA_DIR
+from .metrics import METRICS
+from .upstream import UPSTREAM, UpstreamError
+
+SYMBOL_FILE = os.path.join(DATA_DIR, "symbols.csv")
+# 隨附的主檔只是幾十檔熱門代碼的種子；少於這個檔數或超過這麼多天沒更新就視為需要重建
+SYMBOL_MIN_ROWS = 1000
+SYMBOL_MAX_AGE_DAYS = 7
+SymbolInfo = namedtuple("SymbolInfo", ["name", "suffix", "type", "industry"])
+# 證交所 ISIN 公開清單：strMode=2 上市 (.TW)、strMode=4 上櫃 (.TWO)
+ISIN_SOURCES = {".TW": "https://isin.twse.com.tw/isin/C_public.jsp?strMode=2",
+                ".TWO": "https://isin.twse.com.tw/isin/C_public.jsp?strMode=4"}
+ISIN_SECTIONS = {"股票": "股票", "ETF": "ETF", "ETN": "ETN", "臺灣存託憑證(TDR)": "TDR"}
+
+@functools.lru_cache(maxsize=None)
+def load_symbol_master():
+    """從本地清單載入主檔，之後查詢皆為 O(1) 且不連網"""
+    if not os.path.exists(SYMBOL_FILE): return {}
+    table = pd.read_csv(SYMBOL_FILE, dtype=str, keep_default_na=False)
+    return {r.code: SymbolInfo(r.name, r.suffix, r.type, r.industry) for r in table.itertuples(index=False)}
+
+def refresh_symbol_master():
+    """重新下載上市櫃清單並覆寫本地主檔 (批次與儀表板的背景執行緒使用，頁面請求不會等它)"""
+    records = []
+    for suffix, url in ISIN_SOURCES.items():
+        res = UPSTREAM.get("twse", url, timeout=30)
+        res.encoding = 'cp950'
+        raw = pd.read_html(io.StringIO(res.text), header=0, flavor='bs4')[0]
+        section = None
+        for row in raw.itertuples(index=False):
+            head = str(row[0]).strip()
+            if head == str(row[1]).strip():  # 分類標題列 (整列同值)
+                section = ISIN_SECTIONS.get(head)
+                continue
+            if section is None or "\u3000" not in head: continue
+            code, name = head.split("\u3000", 1)
+            industry = "" if pd.isna(row[4]) else str(row[4]).strip()
+            records.append((code.strip(), name.strip(), suffix, section, industry))
+    if not records: return load_symbol_master()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    pd.DataFrame(records, columns=["code", *SymbolInfo._fields]).to_csv(SYMBOL_FILE, index=False)
+    load_symbol_master.cache_clear()
+    return load_symbol_master()
+
+def symbol_master_stale(max_age_days=SYMBOL_MAX_AGE_DAYS):
+    """主檔不存在、只有隨附的種子清單，或超過 max_age_days 沒更新"""
+    if not os.path.exists(SYMBOL_FILE): return True
+    if len(load_symbol_master()) < SYMBOL_MIN_ROWS: return True
+    return time.time() - os.path.getmtime(SYMBOL_FILE) > max_age_days * 86400
+
+def ensure_symbol_master(max_age_days=SYMBOL_MAX_AGE_DAYS):
+    """主檔過期時重建；上游失敗就沿用現有的 (含種子清單)，不丟例外"""
+    if symbol_master_stale(max_age_days):
+        try: return refresh_symbol_master()
+        except (UpstreamError, ValueError): pass
+    return load_symbol_master()
+
+def lookup_symbol(stock_code):
+    return load_symbol_master().get(str(stock_code).strip())
+
+def candidate_suffixes(stock_code):
+    """主檔有登錄就直接用其市場別；未登錄 (如新上市) 才退回逐一嘗試"""
+    info = lookup_symbol(stock_code)
+    METRICS.count("symbol_master", "hits" if info else "misses")
+    return [info.suffix] if info else [".TW", ".TWO"]
+
+def get_stock_name(stock_code):
+    with METRICS.timed("name_lookup"): info = lookup_symbol(stock_code)
+    return info.name if info else str(stock_code).strip()
@@ -0,0 +1,140 @@
+"""上游連線層：連線池 / 限流 / 重試 / 斷路器"""
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import METRICS
+
+# 每個上游主機：每秒補充的 token 數、桶容量
+RATE_LIMITS = {"yahoo": (2.0, 5), "twse": (1.0, 2)}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE, BACKOFF_CAP = 0.5, 8.0
+BREAKER_THRESHOLD, BREAKER_COOLDOWN = 5, 60.0
+
+class UpstreamError(Exception):
+    """上游在重試後仍失敗 (或斷路器開啟中) 且沒有可用的舊資料"""
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate, self.capacity = rate, capacity
+        self.tokens, self.updated = float(capacity), time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """連續失敗達門檻即開路一段時間，期間不打上游；冷卻後進入半開，只放行一個試探，
+    試探成功即關路、失敗立刻再開路 (試探一直沒有結果時，再過一個冷卻期放行下一個)"""
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.failures, self.opened_at, self.probe_at = 0, None, None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None: return True
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown: return False
+            if self.probe_at is not None and now - self.probe_at < self.cooldown: return False
+            self.probe_at = now
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            if ok: self.failures, self.opened_at, self.probe_at = 0, None, None
+            else:
+                self.failures += 1
+                if self.probe_at is not None or self.failures >= self.threshold:
+                    self.opened_at, self.probe_at = time.monotonic(), None
+
+class UpstreamClient:
+    """所有對外呼叫的共用入口：每主機限流、429/5xx 指數退避 + 抖動、斷路器與最後一次成功結果"""
+    def __init__(self, rate_limits=RATE_LIMITS, last_good_size=512):
+        self._session = None
+        self.buckets = {host: TokenBucket(*limit) for host, limit in rate_limits.items()}
+        self.breakers = {host: CircuitBreaker() for host in rate_limits}
+        self.last_good = OrderedDict()
+        self.last_good_size = last_good_size
+        self.stats = {host: {"calls": 0, "failures": 0, "retries": 0, "stale": 0} for host in rate_limits}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """第一次直接打 HTTP 時才建立連線池 (只用 yfinance 的流程不必載入 requests)"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({'User-Agent': 'Mozilla/5.0'})
+            self._session = session
+        return self._session
+
+    @staticmethod
+    def _retryable(exc):
+        import requests
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout)): return True
+        response = getattr(exc, "response", None)
+        if response is not None and getattr(response, "status_code", None) in RETRY_STATUS: return True
+        # yfinance 被限流時丟 YFRateLimitError / "Too Many Requests"
+        return type(exc).__name__ == "YFRateLimitError" or "Too Many Requests" in str(exc)
+
+    def _remember(self, cache_key, result):
+        with self._lock:
+            self.last_good[cache_key] = result
+            self.last_good.move_to_end(cache_key)
+            while len(self.last_good) > self.last_good_size: self.last_good.popitem(last=False)
+
+    def _fallback(self, host, cache_key, exc):
+        with self._lock:
+            if cache_key is not None and cache_key in self.last_good:
+                self.stats[host]["stale"] += 1
+                return self.last_good[cache_key]
+        if isinstance(exc, UpstreamError): raise exc
+        raise UpstreamError(f"{host}: {exc}") from exc
+
+    def call(self, host, fn, *args, cache_key=None, **kwargs):
+        stats = self.stats[host]
+        if not self.breakers[host].allow():
+            return self._fallback(host, cache_key, UpstreamError(f"{host}: circuit open"))
+        for attempt in range(MAX_RETRIES + 1):
+            self.buckets[host].acquire()
+            stats["calls"] += 1
+            try:
+                with METRICS.timed(f"upstream.{host}"): result = fn(*args, **kwargs)
+            except Exception as exc:
+                if not self._retryable(exc) or attempt == MAX_RETRIES:
+                    stats["failures"] += 1
+                    self.breakers[host].record(False)
+                    return self._fallback(host, cache_key, exc)
+                stats["retries"] += 1
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            self.breakers[host].record(True)
+            if cache_key is not None: self._remember(cache_key, result)
+            return result
+
+    def get(self, host, url, timeout=30, **kwargs):
+        def fetch():
+            res = self.session.get(url, timeout=timeout, **kwargs)
+            res.raise_for_status()
+            return res
+        return self.call(host, fetch)
+
+# yfinance 自帶 curl_cffi 連線 (會重用連線)，這裡只負責限流、重試與斷路
+UPSTREAM = UpstreamClient()
+METRICS.register("upstream", lambda: {host: dict(v) for host, v in UPSTREAM.stats.items()})